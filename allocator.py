@@ -0,0 +1,106 @@
+import bisect
+
+
+# Hands out ranges of a buffer with `capacity` slots. Freed ranges are
+# coalesced with their neighbours and kept in free lists keyed by size. `end`
+# is the high water mark: everything in use lies below it, and freeing the
+# last range lowers it.
+class Allocator:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.end = 0
+
+        self.allocations = {}
+        self._allocation_ends = {}
+
+        self.free_blocks = {}
+        self._free_block_ends = {}
+        self._free_lists = {}
+        self._free_sizes = []
+
+    @property
+    def used(self):
+        return self.end - sum(self.free_blocks.values())
+
+    def allocate(self, size):
+        offset = self._allocate_free(size)
+        if offset is None:
+            if self.end + size > self.capacity:
+                return None
+            offset = self.end
+            self.end += size
+
+        self._add_allocation(offset, size)
+        return offset
+
+    def free(self, offset):
+        size = self.allocations.pop(offset)
+        del self._allocation_ends[offset + size]
+
+        following = self.free_blocks.get(offset + size)
+        if following is not None:
+            self._remove_free(offset + size)
+            size += following
+
+        preceding = self._free_block_ends.get(offset)
+        if preceding is not None:
+            size += offset - preceding
+            offset = preceding
+            self._remove_free(offset)
+
+        if offset + size == self.end:
+            self.end = offset
+        else:
+            self._add_free(offset, size)
+
+    def move_last(self):
+        # Move the allocation at the top of the buffer into a hole further
+        # down, so the drawn range shrinks. Returns (old, new, size), or None
+        # if there's no hole big enough.
+        offset = self._allocation_ends.get(self.end)
+        if offset is None:
+            return None
+
+        size = self.allocations[offset]
+        new_offset = self._allocate_free(size)
+        if new_offset is None:
+            return None
+
+        self._add_allocation(new_offset, size)
+        self.free(offset)
+        return (offset, new_offset, size)
+
+    def _add_allocation(self, offset, size):
+        self.allocations[offset] = size
+        self._allocation_ends[offset + size] = offset
+
+    def _allocate_free(self, size):
+        index = bisect.bisect_left(self._free_sizes, size)
+        if index == len(self._free_sizes):
+            return None
+
+        block_size = self._free_sizes[index]
+        offset = next(iter(self._free_lists[block_size]))
+        self._remove_free(offset)
+        if block_size > size:
+            self._add_free(offset + size, block_size - size)
+        return offset
+
+    def _add_free(self, offset, size):
+        self.free_blocks[offset] = size
+        self._free_block_ends[offset + size] = offset
+
+        if size not in self._free_lists:
+            self._free_lists[size] = set()
+            bisect.insort(self._free_sizes, size)
+        self._free_lists[size].add(offset)
+
+    def _remove_free(self, offset):
+        size = self.free_blocks.pop(offset)
+        del self._free_block_ends[offset + size]
+
+        offsets = self._free_lists[size]
+        offsets.remove(offset)
+        if not offsets:
+            del self._free_lists[size]
+            self._free_sizes.remove(size)
@@ -0,0 +1,86 @@
+import argparse
+import fnmatch
+import json
+import sys
+import timeit
+import traceback
+
+from benchmarks import fake_gl
+
+fake_gl.install()
+
+from benchmarks.cases import BENCHMARKS
+
+def measure(operation, repeat):
+    timer = timeit.Timer(operation)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return number / best
+
+
+def load_baseline(path):
+    if path is None:
+        return {}
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {}
+
+
+def main(args):
+    baseline = load_baseline(args.baseline)
+    results = {}
+    regressions = []
+    errors = []
+
+    print(f"{'benchmark':<28} {'ops/sec':>14} {'baseline':>14} {'change':>8}")
+    for (name, setup) in BENCHMARKS.items():
+        if args.k and not fnmatch.fnmatch(name, args.k):
+            continue
+
+        try:
+            operation = setup()
+            ops = results[name] = measure(operation, args.repeat)
+        except Exception:
+            traceback.print_exc()
+            errors.append(name)
+            print(f"{name:<28} {'ERROR':>14}")
+            continue
+
+        if name in baseline:
+            change = ops / baseline[name] - 1
+            flag = ""
+            if change < -args.tolerance:
+                regressions.append(name)
+                flag = "  REGRESSION"
+            print(f"{name:<28} {ops:>14,.0f} {baseline[name]:>14,.0f} {change:>+8.1%}{flag}")
+        else:
+            print(f"{name:<28} {ops:>14,.0f} {'-':>14}")
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, "w") as fh:
+            json.dump(baseline, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+
+    if errors:
+        print(f"{len(errors)} benchmark(s) failed: {', '.join(errors)}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+    return 1 if errors or regressions else 0
+
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser("python -m benchmarks")
+    argument_parser.add_argument("-k", help="only run benchmarks matching this glob")
+    argument_parser.add_argument("--baseline", help="compare against the results stored in this file")
+    argument_parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    argument_parser.add_argument("--tolerance", type=float, default=0.25)
+    argument_parser.add_argument("--repeat", type=int, default=5)
+
+    args = argument_parser.parse_args()
+    if args.save and args.baseline is None:
+        argument_parser.error("--save needs a --baseline file to save to")
+    sys.exit(main(args))
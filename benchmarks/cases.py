@@ -0,0 +1,225 @@
+import io
+import itertools
+import math
+import os.path
+import tempfile
+
+BENCHMARKS = {}
+
+# Kept until exit, when they're removed.
+TEMPORARY_DIRECTORIES = []
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+@benchmark("matrix.matmul")
+def matrix_matmul():
+    from matrix import Matrix
+    from vector import Vector
+
+    a = Matrix.rotate(math.pi / 3, Vector(1, 2, 3))
+    b = Matrix.translate(Vector(4, 5, 6))
+    return lambda: a @ b
+
+
+@benchmark("matrix.mvp")
+def matrix_mvp():
+    from matrix import Matrix
+    from vector import Vector
+
+    translate = Matrix.translate(Vector(4, 5, 6))
+    rotate = Matrix.rotate_2d(0.3, 0.2)
+    project = Matrix.perspective(60, 1.5, 0.1, 500)
+    return lambda: Matrix.chain(translate, rotate, project)
+
+
+@benchmark("frustum.cull")
+def frustum_cull():
+    import numpy as np
+
+    from frustum import boxes_visible, frustum_planes
+    from matrix import Matrix
+    from vector import Vector
+
+    # Every 32x32 chunk of the 1000x1000 world.
+    matrix = Matrix.chain(
+        Matrix.translate(Vector(-500, -1, -500)), Matrix.rotate_2d(0.3, 0.2), Matrix.perspective(60, 1.5, 0.1, 500)
+    )
+    lows = np.array([(x, 0, z) for x in range(0, 1024, 32) for z in range(0, 1024, 32)], dtype=np.float32)
+    highs = lows + (32, 2, 32)
+    return lambda: boxes_visible(frustum_planes(matrix), lows, highs)
+
+
+@benchmark("vector.add")
+def vector_add():
+    from vector import Vector
+
+    a, b = Vector(1, 2, 3), Vector(4, 5, 6)
+    return lambda: a + b
+
+
+@benchmark("vector.scale")
+def vector_scale():
+    from vector import Vector
+
+    a = Vector(1, 2, 3)
+    return lambda: 0.5 * a
+
+
+@benchmark("vector.cross")
+def vector_cross():
+    from vector import Vector
+
+    a, b = Vector(1, 2, 3), Vector(4, 5, 6)
+    return lambda: a.cross(b)
+
+
+@benchmark("vector.unit")
+def vector_unit():
+    from vector import Vector
+
+    a = Vector(1, 2, 3)
+    return lambda: a.unit()
+
+
+@benchmark("mesh.cube")
+def mesh_cube():
+    from mesh import Cube, tex_coords
+    from vector import Vector
+
+    position, size, texture = Vector(10, 0, 20), Vector(0.6, 0.6, 0.6), tex_coords(0, 1, 0, 1, 3)
+    return lambda: Cube(position, size, color="#0000ff", texture=texture)
+
+
+@benchmark("mesh.accumulate")
+def mesh_accumulate():
+    from mesh import Cube, Mesh
+    from vector import Vector
+
+    cubes = [Cube(Vector(x, 0, x)) for x in range(100)]
+
+    def accumulate():
+        mesh = Mesh()
+        for cube in cubes:
+            mesh += cube
+        return mesh.instances
+
+    return accumulate
+
+
+@benchmark("mesh.cube_vertices")
+def mesh_cube_vertices():
+    from mesh import Cube, Mesh
+    from vector import Vector
+
+    mesh = Mesh()
+    for x in range(100):
+        mesh += Cube(Vector(x, 0, x))
+    return lambda: mesh.data
+
+
+def sample_entities():
+    walls = [
+        {"id": 1000 + i, "type": "Wall", "pos": {"x": i, "y": 7}, "color": color, "wall_text": None}
+        for (i, color) in enumerate(["gray", "pink", "orange", "green", "blue", "purple", "yellow"])
+    ]
+    return {
+        "Wall": walls[0],
+        "Desk": {"id": 2000, "type": "Desk", "pos": {"x": 12, "y": 30}},
+        "Avatar": {"id": 3000, "type": "Avatar", "pos": {"x": 45, "y": 53}, "image_path": None},
+        "ZoomLink": {"id": 4000, "type": "ZoomLink", "pos": {"x": 3, "y": 4}},
+        "Bot": {"id": 5000, "type": "Bot", "pos": {"x": 8, "y": 9}, "emoji": "🚀"},
+        "Link": {"id": 6000, "type": "Link", "pos": {"x": 10, "y": 11}},
+        "Note": {"id": 7000, "type": "Note", "pos": {"x": 12, "y": 13}},
+        "AudioBlock": {"id": 8000, "type": "AudioBlock", "pos": {"x": 14, "y": 15}},
+        "RC::Calendar": {"id": 9000, "type": "RC::Calendar", "pos": {"x": 16, "y": 17}},
+        "AudioRoom": {"id": 10000, "type": "AudioRoom", "pos": {"x": 20, "y": 20}, "width": 6, "height": 4},
+    }, walls
+
+
+def register_get_mesh(entity_type):
+    @benchmark(f"get_mesh.{entity_type}")
+    def get_mesh_case():
+        from mesh import tex_coords
+        from virtualrc import get_mesh
+
+        entity = sample_entities()[0][entity_type]
+        texture = tex_coords(0, 1, 0, 1, 1)
+        return lambda: get_mesh(entity_type, entity, texture)
+
+
+for _entity_type in sample_entities()[0]:
+    register_get_mesh(_entity_type)
+
+
+def avatar_photo():
+    import pyglet
+
+    image = pyglet.image.ImageData(150, 150, "RGBA", bytes(150 * 150 * 4))
+    buffer = io.BytesIO()
+    image.save("avatar.png", file=buffer)
+    return buffer.getvalue()
+
+
+def new_virtual_rc():
+    # With its thumbnails in a temporary directory, not the user's photos.
+    from camera import Camera
+    from thumbnails import ThumbnailStore
+    from vector import Vector
+    from virtualrc import VirtualRc
+
+    directory = tempfile.TemporaryDirectory()
+    TEMPORARY_DIRECTORIES.append(directory)
+    thumbnails = ThumbnailStore(os.path.join(directory.name, "thumbnails.pack"))
+    return VirtualRc(Camera(800, 600, Vector(0, 0, 0), Vector(0, 0)), thumbnails)
+
+
+@benchmark("virtualrc.handle_entity")
+def handle_entity():
+    from virtualrc import PHOTOS
+
+    entities, walls = sample_entities()
+    PHOTOS[entities["Avatar"]["id"]] = avatar_photo()
+
+    virtual_rc = new_virtual_rc()
+    # Glyph rasterisation depends on the installed emoji font and has its own benchmark.
+    del entities["Bot"]
+    stream = itertools.cycle(list(entities.values()) + walls)
+    return lambda: virtual_rc.handle_entity(next(stream))
+
+
+@benchmark("virtualrc.snapshot")
+def snapshot():
+    # A thousand notes and links, as sent on connecting.
+    entities = [
+        {"id": i, "type": ["Note", "Link"][i % 2], "pos": {"x": i % 100, "y": i // 100}} for i in range(1000)
+    ]
+    virtual_rc = new_virtual_rc()
+    return lambda: virtual_rc.handle_entities(entities)
+
+
+@benchmark("walls.remesh")
+def walls_remesh():
+    from mesh import tex_coords
+    from wall_mesher import WallMesher
+
+    # A block with a room of walls in it, half of them with text.
+    mesher = WallMesher()
+    for i in range(12):
+        for (x, z) in [(i, 0), (i, 11), (0, i), (11, i)]:
+            mesher.add_wall((x, z), x, z, "#919c9c", tex_coords(0, 1, 1, 0, 3) if i % 2 else None)
+    return lambda: mesher.block_mesh((0, 0))
+
+
+@benchmark("textures.glyph")
+def glyph():
+    from textures import Glyph
+
+    characters = itertools.cycle("🚀👾🤖🐙🦄🌈🍕🎉")
+    return lambda: Glyph(next(characters))
@@ -0,0 +1,17 @@
+import pyglet
+
+pyglet.options["shadow_window"] = False
+
+import pyglet.gl as gl
+
+
+def no_op(*_args, **_kwargs):
+    return 0
+
+
+def install():
+    # Replace every GL entry point with a no-op, so the Python side of the
+    # renderer can be measured without a window or a driver.
+    for name in dir(gl):
+        if name.startswith("gl") and callable(getattr(gl, name)):
+            setattr(gl, name, no_op)
@@ -6,16 +6,20 @@ from matrix import Matrix
 
 class Camera:
     def __init__(self, width, height, position, rotation):
-        self.height = height
-        self.width = width
-        self.position = position
-        self.rotation = rotation
+        self._width = width
+        self._height = height
+        self._position = position
+        self._rotation = rotation
 
-        self.translate = Matrix.identity()
-        self.rotate = Matrix.identity()
-        self.project = Matrix.identity()
+        self._project = None
+        self._rotate = None
+        self._translate = None
+        self._mvp_matrix = None
 
     def update(self, dt, input_vector):
+        if not any(input_vector):
+            return
+
         s = dt * 5
 
         rotY = self.rotation.y / 180 * math.pi
@@ -28,17 +32,65 @@ class Camera:
         )
 
     def resize(self, width, height):
-        self.width = width
-        self.height = height
+        if (width, height) != (self._width, self._height):
+            self._width = width
+            self._height = height
+            self._project = None
+            self._mvp_matrix = None
 
     def update_mouse(self, input_vector):
-        self.rotation += input_vector
+        if any(input_vector):
+            self.rotation += input_vector
 
     @property
-    def mvp_matrix(self):
-        return self.translate @ self.rotate @ self.project
+    def width(self):
+        return self._width
+
+    @property
+    def height(self):
+        return self._height
+
+    @property
+    def position(self):
+        return self._position
+
+    @position.setter
+    def position(self, position):
+        self._position = position
+        self._translate = None
+        self._mvp_matrix = None
+
+    @property
+    def rotation(self):
+        return self._rotation
 
-    def compute_matrices(self):
-        self.project = Matrix.perspective(60, self.width / self.height, 0.1, 500)
-        self.rotate = Matrix.rotate_2d(2 * math.pi * self.rotation[1] / 360, 2 * math.pi * self.rotation[0] / 360)
-        self.translate = Matrix.translate(-self.position)
+    @rotation.setter
+    def rotation(self, rotation):
+        self._rotation = rotation
+        self._rotate = None
+        self._mvp_matrix = None
+
+    @property
+    def project(self):
+        if self._project is None:
+            self._project = Matrix.perspective(60, self.width / self.height, 0.1, 500)
+        return self._project
+
+    @property
+    def rotate(self):
+        if self._rotate is None:
+            self._rotate = Matrix.rotate_2d(2 * math.pi * self.rotation[1] / 360, 2 * math.pi * self.rotation[0] / 360)
+        return self._rotate
+
+    @property
+    def translate(self):
+        # ShadowMap relies on this being the same object until the camera moves.
+        if self._translate is None:
+            self._translate = Matrix.translate(-self.position)
+        return self._translate
+
+    @property
+    def mvp_matrix(self):
+        if self._mvp_matrix is None:
+            self._mvp_matrix = Matrix.chain(self.translate, self.rotate, self.project)
+        return self._mvp_matrix
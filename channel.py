@@ -0,0 +1,83 @@
+import asyncio
+from collections import deque
+import threading
+import time
+
+
+class Channel:
+    # Passes items from any thread to one consumer, in batches. The consumer
+    # `listen`s with a function that wakes it, which the first `put` after
+    # each `take` calls on the producer's thread. So however many items are
+    # put in between, the consumer wakes once and takes them all.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = []
+        self.notify = None
+        self.notified = False
+        self.latencies = deque(maxlen=1000)
+
+    def put(self, item):
+        with self.lock:
+            self.items.append((item, time.monotonic()))
+            if self.notify is None or self.notified:
+                return
+            self.notified = True
+        self.notify()
+
+    def listen(self, notify):
+        with self.lock:
+            self.notify = notify
+            self.notified = bool(self.items)
+        if self.notified:
+            notify()
+
+    def take(self):
+        # Everything put since the last take, oldest first.
+        with self.lock:
+            (items, self.items) = (self.items, [])
+            self.notified = False
+
+        now = time.monotonic()
+        self.latencies.extend(now - queued for (_, queued) in items)
+        return [item for (item, _) in items]
+
+    async def batches(self):
+        # Listens on the running event loop, yielding each batch as it comes.
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+
+        def notify():
+            # Producers keep putting after the loop has closed, on shutdown,
+            # when there's no one left to wake.
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                pass
+
+        self.listen(notify)
+        while True:
+            await ready.wait()
+            ready.clear()
+            items = self.take()
+            if items:
+                yield items
+
+    def stats(self):
+        latencies = list(self.latencies)
+        return {
+            "waiting": len(self.items),
+            "latency_mean": sum(latencies) / len(latencies) if latencies else 0.0,
+            "latency_max": max(latencies, default=0.0),
+        }
+
+
+class DeduplicatingChannel(Channel):
+    # Drops items equal to the one put before them.
+    def __init__(self):
+        super().__init__()
+        self.last_item = object()
+
+    def put(self, item):
+        if item != self.last_item:
+            self.last_item = item
+            super().put(item)
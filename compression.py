@@ -0,0 +1,118 @@
+import hashlib
+import os
+
+import numpy as np
+
+from images import resize_axis
+
+COMPRESSED_DIR = "compressed"
+
+# A DXT5 (BC3) block is 4x4 pixels in 16 bytes: 8 bytes of alpha, then 8 of
+# colour.
+BLOCK_BYTES = 16
+
+
+def mip_sizes(width, height):
+    sizes = [(width, height)]
+    while max(width, height) > 1:
+        (width, height) = (max(width // 2, 1), max(height // 2, 1))
+        sizes.append((width, height))
+    return sizes
+
+
+def mip_chain(pixels):
+    # (rows, columns, 4) pixels, then each half the size, down to 1x1.
+    levels = [pixels]
+    while max(pixels.shape[:2]) > 1:
+        (rows, columns) = pixels.shape[:2]
+        pixels = resize_axis(resize_axis(pixels, max(rows // 2, 1), 0), max(columns // 2, 1), 1).astype(np.uint8)
+        levels.append(pixels)
+    return levels
+
+
+def compressed_size(width, height):
+    return ((width + 3) // 4) * ((height + 3) // 4) * BLOCK_BYTES
+
+
+def to_blocks(pixels):
+    # (rows, columns, 4) pixels as (blocks, 16, 4), padding the edges out to
+    # whole blocks by repeating them.
+    (rows, columns) = pixels.shape[:2]
+    pixels = np.pad(pixels, ((0, -rows % 4), (0, -columns % 4), (0, 0)), mode="edge")
+    (rows, columns) = pixels.shape[:2]
+    blocks = pixels.reshape(rows // 4, 4, columns // 4, 4, 4).swapaxes(1, 2)
+    return blocks.reshape(-1, 16, 4)
+
+
+def pack_indices(indices, bits):
+    # Each row of `indices` packed into one integer, first index lowest.
+    shifts = np.arange(indices.shape[1], dtype=np.uint64) * np.uint64(bits)
+    return np.bitwise_or.reduce(indices.astype(np.uint64) << shifts, axis=1)
+
+
+def to_rgb565(rgb):
+    rgb = rgb.astype(np.uint32)
+    return ((rgb[:, 0] >> 3) << 11) | ((rgb[:, 1] >> 2) << 5) | (rgb[:, 2] >> 3)
+
+
+def from_rgb565(packed):
+    r = (packed >> 11) & 31
+    g = (packed >> 5) & 63
+    b = packed & 31
+    return np.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)], axis=1).astype(np.int32)
+
+
+def compress_dxt5(pixels):
+    # Compresses (rows, columns, 4) RGBA pixels, fitting each block's colours
+    # and alphas to the line between their extremes.
+    blocks = to_blocks(pixels).astype(np.int32)
+
+    alpha = blocks[:, :, 3]
+    (a0, a1) = (alpha.max(axis=1), alpha.min(axis=1))
+    # With a0 > a1 codes 0 and 1 are a0 and a1 and 2 to 7 step from a0 to a1.
+    steps = np.rint((a0[:, None] - alpha) * 7 / np.maximum(a0 - a1, 1)[:, None]).astype(np.int32)
+    alpha_codes = np.choose(steps, [0, 2, 3, 4, 5, 6, 7, 1])
+    alpha_codes[a0 == a1] = 0
+
+    rgb = blocks[:, :, :3]
+    c0 = to_rgb565(rgb.max(axis=1))
+    c1 = to_rgb565(rgb.min(axis=1))
+    (e0, e1) = (from_rgb565(c0), from_rgb565(c1))
+    palette = np.stack([e0, e1, (2 * e0 + e1) // 3, (e0 + 2 * e1) // 3], axis=1)
+    distances = ((rgb[:, :, None, :] - palette[:, None, :, :]) ** 2).sum(axis=3)
+    colour_codes = distances.argmin(axis=2)
+
+    alpha_bits = pack_indices(alpha_codes, 3)
+    compressed = np.zeros((len(blocks), 4), "<u4")
+    compressed[:, 0] = a0 | (a1 << 8) | ((alpha_bits & np.uint64(0xFFFF)) << np.uint64(16)).astype(np.int64)
+    compressed[:, 1] = alpha_bits >> np.uint64(16)
+    compressed[:, 2] = c0 | (c1 << 16)
+    compressed[:, 3] = pack_indices(colour_codes, 2)
+    return compressed.tobytes()
+
+
+def compress_mipmaps(pixels, directory=COMPRESSED_DIR):
+    # The DXT5 compressed levels of the mip chain of `pixels`. Compressing is
+    # slow, so the result is kept on disk, named by a hash of the pixels.
+    pixels = np.ascontiguousarray(pixels, np.uint8)
+    digest = hashlib.sha1(pixels.tobytes())
+    digest.update(str(pixels.shape).encode())
+    path = os.path.join(directory, f"{digest.hexdigest()}.dxt5")
+
+    sizes = [compressed_size(width, height) for (width, height) in mip_sizes(pixels.shape[1], pixels.shape[0])]
+    try:
+        with open(path, "rb") as fh:
+            data = fh.read()
+    except FileNotFoundError:
+        data = b""
+
+    if len(data) != sum(sizes):
+        data = b"".join(compress_dxt5(level) for level in mip_chain(pixels))
+        os.makedirs(directory, exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as fh:
+            fh.write(data)
+        os.replace(temporary, path)
+
+    offsets = np.cumsum([0] + sizes)
+    return [data[start:end] for (start, end) in zip(offsets[:-1], offsets[1:])]
@@ -0,0 +1,23 @@
+import numpy as np
+
+
+def frustum_planes(matrix):
+    # Clip space is -w <= x, y, z <= w, and with row vectors clip = v @ M, so
+    # each side of the frustum is a plane (a, b, c, d) made from the sum or
+    # difference of two columns of M. Points inside have a.x + b.y + c.z + d >= 0.
+    (x, y, z, w) = matrix.array.T
+    return np.array([w + x, w - x, w + y, w - y, w + z, w - z])
+
+
+def boxes_visible(planes, lows, highs):
+    # For each axis aligned box, test the corner furthest along each plane's
+    # normal. A box is culled if that corner is outside any plane.
+    corners = np.where(planes[:, None, :3] > 0, highs, lows)
+    distances = (corners * planes[:, None, :3]).sum(axis=2) + planes[:, 3:]
+    return (distances >= 0).all(axis=0)
+
+
+def box_distances(point, lows, highs):
+    # Distance from a point to each axis aligned box, zero for boxes around it.
+    nearest = np.clip(point, lows, highs)
+    return np.linalg.norm(nearest - point, axis=1)
@@ -0,0 +1,79 @@
+import ctypes
+import hashlib
+import mmap
+import os
+import struct
+
+GLYPH_DIR = "glyphs"
+
+# Each file is the width and height of the glyph followed by its RGBA pixels.
+# Characters the font can't render are stored with no pixels.
+HEADER = struct.Struct("<II")
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CachedGlyph:
+    # Pixels mapped from a cache file, handed to GL without copying them.
+    def __init__(self, width, height, pixels):
+        self.width = width
+        self.height = height
+        self.pixels = pixels
+
+    def get_data(self, _format, _pitch):
+        return self.pixels
+
+
+class GlyphCache:
+    # Rendered glyphs on disk, named by the hash of the font file, the pixel
+    # size and the codepoint so that a new font never reads stale glyphs.
+    def __init__(self, font_path, pixel_size, directory=GLYPH_DIR):
+        self.directory = directory
+        self.prefix = f"{file_hash(font_path)[:16]}-{pixel_size}"
+
+    def path(self, character):
+        codepoints = "_".join(f"{ord(c):x}" for c in character)
+        return os.path.join(self.directory, f"{self.prefix}-{codepoints}.rgba")
+
+    def __contains__(self, character):
+        return os.path.exists(self.path(character))
+
+    def load(self, character):
+        # A CachedGlyph, None if the character isn't cached, or ValueError if
+        # the font has no glyph for it.
+        try:
+            with open(self.path(character), "rb") as fh:
+                contents = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_COPY)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if len(contents) < HEADER.size:
+            return None
+        (width, height) = HEADER.unpack_from(contents)
+        if width == 0:
+            raise ValueError(f"Can't generate glyph for: {character!r}")
+        if len(contents) != HEADER.size + width * height * 4:
+            return None
+
+        pixels = (ctypes.c_ubyte * (width * height * 4)).from_buffer(contents, HEADER.size)
+        return CachedGlyph(width, height, pixels)
+
+    def store(self, character, width, height, data):
+        # Written to a temporary file and renamed, so that readers never see
+        # a partial glyph.
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(character)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as fh:
+            fh.write(HEADER.pack(width, height))
+            fh.write(data)
+        os.replace(temporary, path)
+
+    def store_missing(self, character):
+        self.store(character, 0, 0, b"")
@@ -0,0 +1,48 @@
+import numpy as np
+
+
+class RgbaImage:
+    # Decoded RGBA pixels, with the parts of pyglet's ImageData interface that
+    # TextureCube uses.
+    def __init__(self, width, height, data):
+        self.width = width
+        self.height = height
+        self.data = data
+
+    @classmethod
+    def filled(cls, width, height, color):
+        return cls(width, height, bytes(color) * (width * height))
+
+    def get_data(self, _format, _pitch):
+        return self.data
+
+
+def resize_axis(pixels, size, axis):
+    # Each output pixel is the mean of the input pixels that fall inside it,
+    # or the nearest input pixel when enlarging.
+    length = pixels.shape[axis]
+    starts = np.arange(size) * length // size
+    counts = np.maximum(np.diff(np.append(starts, length)), 1)
+
+    shape = [1] * pixels.ndim
+    shape[axis] = size
+    return np.add.reduceat(pixels.astype(np.uint32), starts, axis=axis) // counts.reshape(shape)
+
+
+def fit_image(pixels, width, height):
+    # Crop (rows, columns, channels) pixels about their centre to the aspect
+    # ratio of width x height, then resize them to it.
+    (rows, columns) = pixels.shape[:2]
+    if columns * height > rows * width:
+        crop = rows * width // height
+        pixels = pixels[:, (columns - crop) // 2 :][:, :crop]
+    else:
+        crop = columns * height // width
+        pixels = pixels[(rows - crop) // 2 :][:crop]
+
+    return resize_axis(resize_axis(pixels, height, 0), width, 1).astype(np.uint8)
+
+
+def swap_red_blue(pixels):
+    # BGRA bytes to RGBA, or back.
+    return np.asarray(pixels).reshape(-1, 4)[:, [2, 1, 0, 3]].reshape(-1)
@@ -0,0 +1,47 @@
+from collections import OrderedDict
+
+
+def entity_key(entity):
+    # Photo events share their avatar's id but mustn't replace its updates.
+    if entity["type"] == "Photo":
+        return ("Photo", entity["id"])
+    return entity["id"]
+
+
+class EntityBacklog:
+    # Entity updates waiting to be handled, coalesced by id so that only the
+    # latest state of each entity is kept, in the order of those latest
+    # updates. A delete replaces any updates before it, but an entity
+    # recreated after a delete keeps the delete ahead of it.
+    def __init__(self):
+        self.pending = OrderedDict()
+        self.received = 0
+        self.coalesced = 0
+        self.peak = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def extend(self, entities):
+        for entity in entities:
+            key = entity_key(entity)
+            previous = self.pending.pop(key, None)
+            if previous:
+                self.coalesced += len(previous)
+            if previous and previous[0].get("deleted") and not entity.get("deleted"):
+                self.coalesced -= 1
+                self.pending[key] = [previous[0], entity]
+            else:
+                self.pending[key] = [entity]
+            self.received += 1
+        self.peak = max(self.peak, len(self.pending))
+
+    def take(self, count):
+        # The oldest `count` entities' updates, in order.
+        entities = []
+        for _ in range(min(count, len(self.pending))):
+            entities.extend(self.pending.popitem(last=False)[1])
+        return entities
+
+    def stats(self):
+        return {"backlog": len(self.pending), "peak": self.peak, "received": self.received, "coalesced": self.coalesced}
@@ -0,0 +1,81 @@
+from collections import OrderedDict
+
+
+class LayersFull(Exception):
+    pass
+
+
+# Hands out the layers of a texture array to textures. The array can grow to
+# `max_capacity` layers; after that the least recently used texture that no
+# user references is evicted to make room. Users are whatever draws with a
+# texture, such as entity ids, and hold a reference to one texture each.
+class LayerAllocator:
+    def __init__(self, capacity, max_capacity=None):
+        self.capacity = capacity
+        self.max_capacity = max(capacity, max_capacity or capacity)
+
+        self.layers = OrderedDict()
+        self.next_layer = 0
+        self.users = {}
+        self.user_textures = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, texture):
+        return texture in self.layers
+
+    def __getitem__(self, texture):
+        return self.layers[texture]
+
+    def lookup(self, texture):
+        # The texture's layer, marked as recently used, or None.
+        layer = self.layers.get(texture)
+        if layer is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.layers.move_to_end(texture)
+        return layer
+
+    def allocate(self, texture):
+        if self.next_layer == self.capacity and self.capacity < self.max_capacity:
+            self.capacity = min(2 * self.capacity, self.max_capacity)
+
+        if self.next_layer < self.capacity:
+            layer = self.next_layer
+            self.next_layer += 1
+        else:
+            layer = self.evict()
+
+        self.layers[texture] = layer
+        return layer
+
+    def evict(self):
+        for (texture, layer) in self.layers.items():
+            if not self.users.get(texture):
+                del self.layers[texture]
+                self.users.pop(texture, None)
+                self.evictions += 1
+                return layer
+        raise LayersFull(f"All {self.capacity} layers are in use.")
+
+    def reference(self, texture, user):
+        self.release(user)
+        self.users.setdefault(texture, set()).add(user)
+        self.user_textures[user] = texture
+
+    def release(self, user):
+        texture = self.user_textures.pop(user, None)
+        if texture is not None:
+            self.users[texture].discard(user)
+
+    def stats(self):
+        return {
+            "layers": len(self.layers),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -1,42 +1,40 @@
-import operator
+import ctypes
+import functools
 import math
 
-from vector import Vector
+import numpy as np
 
+from vector import Vector
 
-def dot(xs, ys):
-    return sum(x * y for (x, y) in zip(xs, ys))
+FLOAT_POINTER = ctypes.POINTER(ctypes.c_float)
 
 
 class Matrix:
     def __init__(self, *rows):
-        self._data = rows
+        self._data = np.array(rows, dtype=np.float32).reshape(4, 4)
+
+    @classmethod
+    def from_array(cls, array):
+        matrix = cls.__new__(cls)
+        matrix._data = np.ascontiguousarray(array, dtype=np.float32)
+        return matrix
 
     def __matmul__(self, other):
-        contents = tuple(
-            tuple(
-                dot(
-                    (self[row, i] for i in range(4)),
-                    (other[i, column] for i in range(4)),
-                )
-                for column in range(4)
-            )
-            for row in range(4)
-        )
-        return Matrix(*contents)
+        return Matrix.from_array(self._data @ other._data)
+
+    @classmethod
+    def chain(cls, *matrices):
+        # Compose several matrices with a single pass through numpy, rather than
+        # allocating a Matrix for every intermediate product.
+        return cls.from_array(functools.reduce(np.matmul, (matrix._data for matrix in matrices)))
 
     def __getitem__(self, row_column):
         (row, column) = row_column
-        return self._data[row][column]
+        return float(self._data[row, column])
 
     @classmethod
     def identity(cls):
-        return cls(
-            (1, 0, 0, 0),
-            (0, 1, 0, 0),
-            (0, 0, 1, 0),
-            (0, 0, 0, 1),
-        )
+        return cls.from_array(np.identity(4, dtype=np.float32))
 
     @classmethod
     def scale(cls, vector):
@@ -115,25 +113,30 @@ class Matrix:
         return cls.frustum(-frustum_x, frustum_x, -frustum_y, frustum_y, near, far)
 
     def __eq__(self, other):
-        return isinstance(other, type(self)) and all(self._pairwise(operator.eq, other))
+        return isinstance(other, type(self)) and bool(np.array_equal(self._data, other._data))
 
     def __add__(self, other):
-        return self._pairwise(operator.add, other)
+        return Matrix.from_array(self._data + other._data)
 
     def __sub__(self, other):
-        return self._pairwise(operator.sub, other)
-
-    def _pairwise(self, f, other):
-        return Matrix(
-            *(tuple(f(a, b) for (a, b) in zip(row_a, row_b)) for (row_a, row_b) in zip(self.rows(), other.rows()))
-        )
+        return Matrix.from_array(self._data - other._data)
 
     def rows(self):
-        return iter(self._data)
+        return iter(self._data.tolist())
 
     def values(self):
         return list(self)
 
+    @property
+    def array(self):
+        return self._data
+
+    @property
+    def gl_pointer(self):
+        # Row-major float32 data, in the layout glUniformMatrix4fv expects
+        # when transpose is GL_FALSE. No copy is made.
+        return self._data.ctypes.data_as(FLOAT_POINTER)
+
     @classmethod
     def orthographic(cls, left, right, bottom, top, near, far):
         scale = cls.scale(Vector(2.0 / (right - left), 2.0 / (top - bottom), 2.0 / (far - near)))
@@ -148,9 +151,7 @@ class Matrix:
         return scale @ translate
 
     def __iter__(self):
-        for row in self._data:
-            for value in row:
-                yield value
+        return iter(self._data.ravel().tolist())
 
     def __repr__(self):
-        return "<Matrix %r>" % (self._data,)
+        return "<Matrix %r>" % (tuple(map(tuple, self.rows())),)
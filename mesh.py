@@ -0,0 +1,262 @@
+import functools
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from vector import Vector
+
+# One interleaved vertex is 24 bytes: float32 positions, half float texture
+# coordinates (u, v, layer) and normalized byte colours and normals. Layers
+# are small integers, which half floats represent exactly up to 2048.
+VERTEX_DTYPE = np.dtype(
+    {
+        "names": ["position", "tex_coords", "color", "normal"],
+        "formats": [(np.float32, 3), (np.float16, 3), (np.uint8, 3), (np.int8, 3)],
+        "offsets": [0, 12, 18, 21],
+        "itemsize": 24,
+    }
+)
+
+# One instance of the unit cube, 40 bytes: the cube's minimum corner and
+# size, the texture rectangle (x0, x1, y0, y1) mapped onto every face, its
+# colour and its texture layer.
+INSTANCE_DTYPE = np.dtype(
+    {
+        "names": ["origin", "size", "tex_rect", "color", "layer"],
+        "formats": [(np.float32, 3), (np.float32, 3), (np.float16, 4), (np.uint8, 3), np.float16],
+        "offsets": [0, 12, 24, 32, 36],
+        "itemsize": 40,
+    }
+)
+
+ORIGIN_WORDS = INSTANCE_DTYPE.itemsize // 4
+
+# The shared unit cube every instance is drawn from.
+CUBE_VERTEX_DTYPE = np.dtype(
+    {
+        "names": ["corner", "normal", "tex_corner"],
+        "formats": [(np.uint8, 3), (np.int8, 3), (np.uint8, 2)],
+        "offsets": [0, 3, 6],
+        "itemsize": 8,
+    }
+)
+
+NO_TEXTURE = -1
+DELETED = -2
+
+DEFAULT_COLOR = "#114433"
+
+# Unit cube corners for the back, front, left, right, bottom and top faces.
+# fmt: off
+CUBE_CORNERS = np.array(
+    [
+        (1, 0, 0), (0, 0, 0), (0, 1, 0), (1, 1, 0),
+        (0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1),
+        (0, 0, 0), (0, 0, 1), (0, 1, 1), (0, 1, 0),
+        (1, 0, 1), (1, 0, 0), (1, 1, 0), (1, 1, 1),
+        (0, 0, 0), (1, 0, 0), (1, 0, 1), (0, 0, 1),
+        (0, 1, 1), (1, 1, 1), (1, 1, 0), (0, 1, 0),
+    ],
+    dtype=np.float32,
+)
+# fmt: on
+
+CUBE_NORMALS = np.repeat(
+    np.array([(0, 0, -1), (0, 0, 1), (-1, 0, 0), (1, 0, 0), (0, -1, 0), (0, 1, 0)], dtype=np.int8) * 127,
+    4,
+    axis=0,
+)
+
+# Where each face's corners sit in the texture rectangle.
+CUBE_TEX_CORNERS = np.tile(np.array([(0, 0), (1, 0), (1, 1), (0, 1)], dtype=np.float32), (6, 1))
+
+# Each quad is drawn as two triangles with the same winding.
+QUAD_TRIANGLES = np.array([0, 1, 2, 0, 2, 3])
+
+TexCoords = namedtuple("TexCoords", ("x0", "x1", "y0", "y1", "layer"))
+
+
+@functools.lru_cache
+def color_to_rgb(color):
+    return (
+        int(color[1:3], 16),
+        int(color[3:5], 16),
+        int(color[5:7], 16),
+    )
+
+
+def tex_coords(x0, x1, y0, y1, texture_index):
+    return TexCoords(x0, x1, y0, y1, texture_index)
+
+
+DEFAULT_TEXTURE = tex_coords(0, 1, 0, 1, NO_TEXTURE)
+
+
+def deleted_instances(size):
+    data = np.zeros(size, INSTANCE_DTYPE)
+    data["layer"] = DELETED
+    return data
+
+
+def instance_bounds(instances):
+    # The (low, high) corners of the box around every instance.
+    corners = np.concatenate([instances["origin"], instances["origin"] + instances["size"]])
+    return (corners.min(axis=0), corners.max(axis=0))
+
+
+def quad_indices(vertex_count, dtype=np.uint32):
+    return (np.arange(0, vertex_count, 4, dtype=dtype)[:, None] + QUAD_TRIANGLES.astype(dtype)).reshape(-1)
+
+
+def index_quads(data):
+    # Triangulate a list of quads, sharing identical vertices.
+    raw = data.view((np.void, VERTEX_DTYPE.itemsize))
+    (unique, inverse) = np.unique(raw, return_inverse=True)
+    return (unique.view(VERTEX_DTYPE), inverse.reshape(-1)[quad_indices(len(data))].astype(np.uint32))
+
+
+CUBE_INDICES = quad_indices(len(CUBE_CORNERS), np.uint8)
+
+
+def unit_cube():
+    data = np.empty(len(CUBE_CORNERS), CUBE_VERTEX_DTYPE)
+    data["corner"] = CUBE_CORNERS
+    data["normal"] = CUBE_NORMALS
+    data["tex_corner"] = CUBE_TEX_CORNERS
+    return data
+
+
+def cube_vertices(instances):
+    # Expand cube instances into 24 vertices each.
+    data = np.empty((len(instances), len(CUBE_CORNERS)), VERTEX_DTYPE)
+
+    data["position"] = instances["origin"][:, None, :] + CUBE_CORNERS * instances["size"][:, None, :]
+    data["color"] = instances["color"][:, None, :]
+    data["normal"] = CUBE_NORMALS
+
+    (x0, x1, y0, y1) = instances["tex_rect"].astype(np.float32).T[:, :, None]
+    tex_coords = data["tex_coords"]
+    tex_coords[..., 0] = x0 + CUBE_TEX_CORNERS[:, 0] * (x1 - x0)
+    tex_coords[..., 1] = y0 + CUBE_TEX_CORNERS[:, 1] * (y1 - y0)
+    tex_coords[..., 2] = instances["layer"][:, None]
+
+    return data.reshape(-1)
+
+
+def cube_instances(positions, sizes, colors, textures, offsets=None):
+    # Many Cubes at once: one instance for each row of the (N, 3) positions,
+    # sizes, offsets and rgb colours and the (N, 5) texture coordinates.
+    origins = np.array(positions, dtype=np.float32)
+    if offsets is not None:
+        origins += offsets
+    origins[:, [0, 2]] -= np.asarray(sizes, dtype=np.float32)[:, [0, 2]] / 2
+    textures = np.asarray(textures, dtype=np.float32).reshape(-1, 5)
+
+    instances = np.zeros(len(origins), INSTANCE_DTYPE)
+    instances["origin"] = origins
+    instances["size"] = sizes
+    instances["tex_rect"] = textures[:, :4]
+    instances["color"] = colors
+    instances["layer"] = textures[:, 4]
+    return instances
+
+
+def concatenate(parts, dtype):
+    # numpy takes a slow, field by field path for structured arrays, so join
+    # them as opaque records instead.
+    raw = np.dtype((np.void, dtype.itemsize))
+    return np.concatenate([part.view(raw) for part in parts] or [np.empty(0, raw)]).view(dtype)
+
+
+class Mesh:
+    def __init__(self, data=None, instances=None):
+        self._vertex_parts = [] if data is None else [data]
+        self._instance_parts = [] if instances is None else [instances]
+
+    @property
+    def data(self):
+        # Parts are only concatenated when they are needed, so building a mesh
+        # from many pieces is linear.
+        parts = self._vertex_parts
+        if self._instance_parts:
+            parts = parts + [cube_vertices(self.instances)]
+        return parts[0] if len(parts) == 1 else concatenate(parts, VERTEX_DTYPE)
+
+    @property
+    def instances(self):
+        if self._vertex_parts:
+            raise ValueError("Mesh contains geometry that isn't made of cubes.")
+        if len(self._instance_parts) != 1:
+            self._instance_parts = [concatenate(self._instance_parts, INSTANCE_DTYPE)]
+        return self._instance_parts[0]
+
+    def indexed(self):
+        return index_quads(self.data)
+
+    def bounds(self):
+        boxes = [instance_bounds(part) for part in self._instance_parts]
+        boxes += [(part["position"].min(axis=0), part["position"].max(axis=0)) for part in self._vertex_parts]
+        return (np.min([low for (low, _) in boxes], axis=0), np.max([high for (_, high) in boxes], axis=0))
+
+    def __iadd__(self, other):
+        self._vertex_parts.extend(other._vertex_parts)
+        self._instance_parts.extend(other._instance_parts)
+        return self
+
+    def __len__(self):
+        vertices = sum(len(part) for part in self._vertex_parts)
+        return vertices + len(CUBE_CORNERS) * sum(len(part) for part in self._instance_parts)
+
+
+class MeshTemplates:
+    # Meshes of cubes built once at the origin, keyed by whatever determines
+    # their shape, and copied into place. The least recently used templates
+    # are dropped beyond `max_size`.
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.templates = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def instantiate(self, key, position, build):
+        template = self.templates.get(key)
+        if template is None:
+            self.misses += 1
+            # Kept as rows of float32 words, which copy much faster than
+            # structured records. The origin is the first three.
+            template = self.templates[key] = build().instances.view(np.float32).reshape(-1, ORIGIN_WORDS)
+            if len(self.templates) > self.max_size:
+                self.templates.popitem(last=False)
+        else:
+            self.hits += 1
+            self.templates.move_to_end(key)
+
+        words = template.copy()
+        words[:, :3] += (position.x, position.y, position.z)
+        return Mesh(instances=words.view(INSTANCE_DTYPE).reshape(-1))
+
+
+class Cube(Mesh):
+    def __init__(
+        self,
+        pos,
+        size=Vector(1, 1, 1),
+        texture=None,
+        color=None,
+        offset=Vector(0, 0, 0),
+    ):
+        a = (pos.x + offset.x - size.x / 2, pos.y + offset.y, pos.z + offset.z - size.z / 2)
+        (x0, x1, y0, y1, layer) = texture or DEFAULT_TEXTURE
+
+        instances = np.zeros(1, INSTANCE_DTYPE)
+        instances[0] = (a, tuple(size), (x0, x1, y0, y1), color_to_rgb(color or DEFAULT_COLOR), layer)
+        super().__init__(instances=instances)
+
+
+class Quad(Mesh):
+    def __init__(self, x0=-1, x1=1, y0=-1, y1=1, depth=-1):
+        data = np.zeros(4, VERTEX_DTYPE)
+        data["position"] = [(x0, y0, depth), (x1, y0, depth), (x1, y1, depth), (x0, y1, depth)]
+        data["color"] = 255
+
+        super().__init__(data)
@@ -1,4 +1,9 @@
+import asyncio
 import os.path
+import traceback
+
+# Photos downloaded at once.
+PHOTO_CONCURRENCY = 4
 
 
 def photo_path(avatar_id, extension):
@@ -13,11 +18,20 @@ def get_photo_ext(avatar_id, extension):
         return None
 
 
+def get_cached_photo(avatar_id):
+    return get_photo_ext(avatar_id, "jpeg") or get_photo_ext(avatar_id, "png")
+
+
+def save_photo(avatar_id, extension, image_data):
+    with open(photo_path(avatar_id, extension), "wb") as fh:
+        fh.write(image_data)
+
+
 async def get_photo(session, avatar_id, image_path):
-    return (
-        get_photo_ext(avatar_id, "jpeg")
-        or get_photo_ext(avatar_id, "png")
-        or await download_photo(session, avatar_id, image_path)
+    # Files are read and written on the default executor, not the event loop.
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, get_cached_photo, avatar_id) or await download_photo(
+        session, avatar_id, image_path
     )
 
 
@@ -31,7 +45,40 @@ async def download_photo(session, avatar_id, image_path):
         elif response.content_type == "image/png":
             extension = "png"
 
-        with open(photo_path(avatar_id, extension), "wb") as fh:
-            fh.write(image_data)
-
+    await asyncio.get_running_loop().run_in_executor(None, save_photo, avatar_id, extension, image_data)
     return image_data
+
+
+class PhotoFetcher:
+    # Fetches avatar photos alongside the entity stream rather than in it:
+    # each avatar's photo is fetched once, at most `concurrency` at a time,
+    # and `on_ready(avatar_id, image_data)` is called with it when it arrives.
+    def __init__(self, fetch, on_ready, concurrency=PHOTO_CONCURRENCY):
+        self.fetch = fetch
+        self.on_ready = on_ready
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.tasks = {}
+        self.fetched = set()
+
+    def request(self, avatar_id, image_path):
+        if avatar_id not in self.tasks and avatar_id not in self.fetched:
+            self.tasks[avatar_id] = asyncio.create_task(self.run(avatar_id, image_path))
+
+    async def run(self, avatar_id, image_path):
+        # A failed fetch isn't retried here. Avatars are sent again every time
+        # they move, and the next request fetches it again.
+        try:
+            async with self.semaphore:
+                image_data = await self.fetch(avatar_id, image_path)
+            self.on_ready(avatar_id, image_data)
+            self.fetched.add(avatar_id)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            del self.tasks[avatar_id]
+
+    async def close(self):
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,121 @@
+import asyncio
+from collections import deque
+import time
+import traceback
+
+# Position updates sent per second, at most.
+MAX_POSITION_RATE = 5
+
+# Seconds `drain` waits for the last position and commands to be sent.
+DRAIN_TIMEOUT = 5.0
+
+
+class AvatarPublisher:
+    # Sends the avatar's position and commands, like building walls, to the
+    # API. Positions are latest-wins: while one is being sent, or the rate
+    # limit holds, a newer position replaces the waiting one instead of
+    # queueing behind it. Commands are sent in order by a task of their own,
+    # so they neither wait for positions nor hold them up.
+    def __init__(self, max_rate=MAX_POSITION_RATE):
+        self.interval = 1 / max_rate
+        self.position = None
+        self.position_time = None
+        self.send_position = None
+        self.position_ready = None
+        self.sending = None
+        self.commands = None
+
+        self.positions_sent = 0
+        self.positions_dropped = 0
+        self.commands_sent = 0
+        self.position_latencies = deque(maxlen=100)
+        self.command_latencies = deque(maxlen=100)
+
+    def put(self, message):
+        if message["type"] == "pos":
+            if self.position is not None:
+                self.positions_dropped += 1
+            self.position = message["payload"]
+            self.position_time = time.monotonic()
+            self.position_ready.set()
+        else:
+            self.commands.put_nowait((message, time.monotonic()))
+
+    def start(self, send_position, send_command):
+        # Returns the future of the sending tasks, on the running loop. Events
+        # and queues belong to the loop they're made on, so they're made here.
+        self.send_position = send_position
+        self.position_ready = asyncio.Event()
+        self.sending = asyncio.Lock()
+        self.commands = asyncio.Queue()
+        return asyncio.gather(self.publish_positions(), self.publish_commands(send_command))
+
+    async def publish_positions(self):
+        while True:
+            await self.position_ready.wait()
+            self.position_ready.clear()
+
+            started = time.monotonic()
+            await self.send_latest_position()
+            await asyncio.sleep(self.interval - (time.monotonic() - started))
+
+    async def send_latest_position(self):
+        # Also for commands that depend on where the avatar is. Sends are
+        # serialised so an older position never lands after a newer one.
+        async with self.sending:
+            if self.position is None:
+                return
+            (position, queued) = (self.position, self.position_time)
+            self.position = None
+
+            if await self.send(self.send_position, position, queued, self.position_latencies):
+                self.positions_sent += 1
+
+    async def publish_commands(self, send_command):
+        while True:
+            (message, queued) = await self.commands.get()
+            try:
+                if await self.send(send_command, message, queued, self.command_latencies):
+                    self.commands_sent += 1
+            finally:
+                self.commands.task_done()
+
+    async def drain(self, timeout=DRAIN_TIMEOUT):
+        # Before shutting down: sends the waiting position and every queued
+        # command, giving up on them after `timeout` seconds.
+        async def send_all():
+            await self.send_latest_position()
+            await self.commands.join()
+
+        try:
+            await asyncio.wait_for(send_all(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Gave up sending {self.commands.qsize()} queued command(s) on shutdown.")
+
+    async def send(self, send, message, queued, latencies):
+        try:
+            await send(message)
+        except Exception:
+            traceback.print_exc()
+            return False
+        latencies.append(time.monotonic() - queued)
+        return True
+
+    def stats(self):
+        return {
+            "commands_queued": self.commands.qsize() if self.commands else 0,
+            "position_waiting": self.position is not None,
+            "positions_sent": self.positions_sent,
+            "positions_dropped": self.positions_dropped,
+            "commands_sent": self.commands_sent,
+            **latency_stats("position", self.position_latencies),
+            **latency_stats("command", self.command_latencies),
+        }
+
+
+def latency_stats(name, latencies):
+    latencies = list(latencies)
+    return {
+        f"{name}_latency_mean": sum(latencies) / len(latencies) if latencies else 0.0,
+        f"{name}_latency_max": max(latencies, default=0.0),
+    }
@@ -1,77 +1,506 @@
 import ctypes
+import math
+import numpy as np
 from pyglet import gl
 
-from vector import Vector
+from allocator import Allocator
+from frustum import box_distances, boxes_visible, frustum_planes
+from uploads import StagingBuffer
+from mesh import (
+    CUBE_INDICES,
+    CUBE_VERTEX_DTYPE,
+    INSTANCE_DTYPE,
+    VERTEX_DTYPE,
+    deleted_instances,
+    unit_cube,
+)
+
+INDEX_DTYPE = np.dtype(np.uint32)
+
+CHUNK_SIZE = 32
+
+VERTEX_ATTRIBUTES = [
+    # (location, field, type, normalized)
+    (0, "position", gl.GL_FLOAT, gl.GL_FALSE),
+    (1, "color", gl.GL_UNSIGNED_BYTE, gl.GL_TRUE),
+    (2, "normal", gl.GL_BYTE, gl.GL_TRUE),
+    (3, "tex_coords", gl.GL_HALF_FLOAT, gl.GL_FALSE),
+]
+
+CUBE_VERTEX_ATTRIBUTES = [
+    (0, "corner", gl.GL_UNSIGNED_BYTE, gl.GL_FALSE),
+    (1, "normal", gl.GL_BYTE, gl.GL_TRUE),
+    (2, "tex_corner", gl.GL_UNSIGNED_BYTE, gl.GL_FALSE),
+]
+
+INSTANCE_ATTRIBUTES = [
+    (3, "origin", gl.GL_FLOAT, gl.GL_FALSE),
+    (4, "size", gl.GL_FLOAT, gl.GL_FALSE),
+    (5, "tex_rect", gl.GL_HALF_FLOAT, gl.GL_FALSE),
+    (6, "color", gl.GL_UNSIGNED_BYTE, gl.GL_TRUE),
+    (7, "layer", gl.GL_HALF_FLOAT, gl.GL_FALSE),
+]
+
+
+class SlotBuffer:
+    # A GPU buffer of `dtype` records, handed out to entities in slots. The
+    # buffer doubles when it's full, and holes left by released slots are
+    # reused and compacted away. Released slots that are still inside the
+    # drawn range are overwritten with `blank` records.
+    #
+    # Writes go to a CPU side staging copy and only reach the GPU when the
+    # buffer is flushed, once per frame. `usage` is the GL buffer usage hint:
+    # static and dynamic buffers upload their dirty ranges, stream buffers
+    # orphan their storage and upload everything in use.
+    #
+    # Only `count` records are drawn. Slots past the range drawn at the last
+    # flush wait until their writes are uploaded, as the GPU may still hold
+    # a released slot's old record there.
+    def __init__(self, dtype, capacity, on_grow, blank=None, usage=gl.GL_DYNAMIC_DRAW):
+        self.dtype = dtype
+        self.on_grow = on_grow
+        self.blank = blank
+        self.usage = usage
+
+        self.slots = {}
+        self.keys = {}
+        self.allocator = Allocator(capacity)
+        self.drawn = 0
+        self.staging = StagingBuffer(dtype, capacity)
+
+        self.vbo = VertexBufferObject()
+        self.vbo.write(self.staging.data, usage)
+
+    @property
+    def end(self):
+        return self.allocator.end
+
+    @property
+    def count(self):
+        return min(self.drawn, self.end)
+
+    @property
+    def capacity(self):
+        return self.allocator.capacity
+
+    def __contains__(self, key):
+        return key in self.slots
+
+    def __getitem__(self, key):
+        return self.slots[key]
+
+    def allocate(self, key, size):
+        if key in self.slots:
+            if self.slots[key][1] == size:
+                return self.slots[key][0]
+            self.release(key)
+
+        offset = self.allocator.allocate(size)
+        if offset is None:
+            self.grow(self.end + size)
+            offset = self.allocator.allocate(size)
+
+        self.slots[key] = (offset, size)
+        self.keys[offset] = key
+        return offset
+
+    def release(self, key):
+        (offset, size) = self.slots.pop(key)
+        del self.keys[offset]
+        self.allocator.free(offset)
+        self.drawn = self.count
+        if self.blank and offset < self.end:
+            self.write(offset, self.blank(size))
+
+    def write(self, offset, data):
+        self.staging.write(offset, data)
+
+    def scatter(self, offsets, data):
+        self.staging.scatter(offsets, data)
+
+    def flush(self, budget=None):
+        if self.usage == gl.GL_STREAM_DRAW:
+            uploaded = self.stream()
+        else:
+            uploaded = 0
+            for (offset, data) in self.staging.take(budget):
+                self.vbo.write_slice(offset * self.dtype.itemsize, data)
+                uploaded += data.nbytes
+
+        # Draw on up to the first record past what was drawn that's still
+        # waiting to be uploaded.
+        drawn = self.count
+        waiting = [max(start, drawn) for (start, end) in self.staging.dirty if end > drawn]
+        self.drawn = min([self.end] + waiting)
+        return uploaded
+
+    def stream(self):
+        # Give the driver fresh storage rather than writing into memory that
+        # draws from earlier frames may still be reading, so the upload never
+        # waits on the GPU. The whole used range has to be sent, so it ignores
+        # the upload budget.
+        if not self.staging.mark_clean():
+            return 0
+
+        data = self.staging.data[: self.end]
+        self.vbo.allocate(self.capacity * self.dtype.itemsize, self.usage)
+        self.vbo.write_slice(0, data)
+        return data.nbytes
+
+    def compact(self, max_moves):
+        # Move slots from the top of the buffer into holes further down, a few
+        # at a time, so the used range shrinks back down.
+        moved = []
+        for _ in range(max_moves):
+            move = self.allocator.move_last()
+            if move is None:
+                break
+
+            (old_offset, new_offset, size) = move
+            key = self.keys.pop(old_offset)
+            self.keys[new_offset] = key
+            self.slots[key] = (new_offset, size)
+
+            self.staging.move(old_offset, new_offset, size)
+            moved.append(key)
+        self.drawn = self.count
+        return moved
+
+    def grow(self, min_size):
+        # Double the buffer, copying the existing contents on the GPU. Writes
+        # that haven't been flushed yet stay dirty and go to the new buffer.
+        # Everything past the copy is uploaded now, whatever the budget, as
+        # slots there are drawn before their writes may have been flushed.
+        capacity = max(2 * self.capacity, min_size)
+        stride = self.dtype.itemsize
+        self.staging.resize(capacity)
+
+        vbo = VertexBufferObject()
+        vbo.allocate(capacity * stride, self.usage)
+        vbo.copy_from(self.vbo, 0, 0, self.end * stride)
+        vbo.write_slice(self.end * stride, self.staging.data[self.end :])
+        self.vbo.delete()
+
+        self.vbo = vbo
+        self.allocator.capacity = capacity
+        self.on_grow()
+
+
+def blank_indices(size):
+    # Degenerate triangles, which draw nothing.
+    return np.zeros(size, INDEX_DTYPE)
 
 
 class Scene:
-    def __init__(self, max_vertices=500_000):
-        self.entities = {}
+    instanced = False
+
+    def __init__(self, max_vertices=500_000, usage=gl.GL_DYNAMIC_DRAW):
+        self.vertices = SlotBuffer(VERTEX_DTYPE, max_vertices, self.bind_buffers, usage=usage)
+        self.indices = SlotBuffer(
+            INDEX_DTYPE, max_vertices * 3 // 2, self.bind_buffers, blank=blank_indices, usage=usage
+        )
 
-        self.data_size = 0
-        self.buffer_size = 0
+        # Indices are stored relative to each entity's vertices, so they can
+        # be rebased when compaction moves the vertices.
+        self.local_indices = {}
 
         self.vao = VertexArrayObject()
+        self.bind_buffers()
+
+    def bind_buffers(self):
         with self.vao:
-            self.vertices = VertexBufferObject()
-            self.colors = VertexBufferObject()
-            self.normals = VertexBufferObject()
-            self.tex_coords = VertexBufferObject()
+            with self.vertices.vbo:
+                set_vertex_attributes(VERTEX_DTYPE, VERTEX_ATTRIBUTES)
+            self.indices.vbo.bind_elements()
+
+    def delete_entity(self, entity_id):
+        if entity_id in self.vertices:
+            self.vertices.release(entity_id)
+            self.indices.release(entity_id)
+            del self.local_indices[entity_id]
+
+    def add_entity(self, entity_id, mesh):
+        (data, indices) = mesh.indexed()
+
+        vertex_offset = self.vertices.allocate(entity_id, len(data))
+        self.vertices.write(vertex_offset, data)
+
+        self.local_indices[entity_id] = indices
+        self.write_indices(entity_id)
+
+    def write_indices(self, entity_id):
+        indices = self.local_indices[entity_id]
+        index_offset = self.indices.allocate(entity_id, len(indices))
+        self.indices.write(index_offset, indices + self.vertices[entity_id][0])
+
+    def compact(self, max_moves=8):
+        for entity_id in self.vertices.compact(max_moves):
+            self.write_indices(entity_id)
+        self.indices.compact(max_moves)
+
+    def flush(self, budget=None):
+        # Vertices go first, and indices wait until all of them are uploaded,
+        # so indices never refer to vertices that aren't on the GPU yet.
+        uploaded = self.vertices.flush(budget)
+        if budget is not None:
+            budget = 0 if self.vertices.staging.dirty else max(budget - uploaded, 0)
+        return uploaded + self.indices.flush(budget)
+
+    def draw(self):
+        with self.vao:
+            gl.glDrawElements(gl.GL_TRIANGLES, self.indices.count, gl.GL_UNSIGNED_INT, None)
+
+
+class UnitCube:
+    def __init__(self):
+        self.vbo = VertexBufferObject()
+        self.vbo.write(unit_cube(), gl.GL_STATIC_DRAW)
+        self.indices = VertexBufferObject()
+        self.indices.write(CUBE_INDICES, gl.GL_STATIC_DRAW)
 
-            self.allocate_buffers(max_vertices)
+
+class InstancedScene:
+    # Every entry is a cube instance, drawn from one shared unit cube, so
+    # adding, moving or deleting a cube rewrites a single 40 byte record.
+    instanced = True
+
+    def __init__(self, max_instances=20_000, usage=gl.GL_DYNAMIC_DRAW, cube=None):
+        self.instances = SlotBuffer(
+            INSTANCE_DTYPE, max_instances, self.bind_buffers, blank=deleted_instances, usage=usage
+        )
+        self.cube = cube or UnitCube()
+
+        self.vao = VertexArrayObject()
+        self.bind_buffers()
+
+    def bind_buffers(self):
+        with self.vao:
+            with self.cube.vbo:
+                set_vertex_attributes(CUBE_VERTEX_DTYPE, CUBE_VERTEX_ATTRIBUTES)
+            with self.instances.vbo:
+                set_vertex_attributes(INSTANCE_DTYPE, INSTANCE_ATTRIBUTES, divisor=1)
+            self.cube.indices.bind_elements()
 
     def delete_entity(self, entity_id):
-        try:
-            (offset, size) = self.entities[entity_id]
-            self.buffers.tex_coords.write_slice(offset, [-2] * size)
-        except KeyError:
-            pass
-
-    def add_entity(self, entity_id, cube):
-        if entity_id in self.entities:
-            (offset, size) = self.entities[entity_id]
-
-            for (vbo, data) in [
-                (self.vertices, cube.vertices),
-                (self.colors, cube.colors),
-                (self.normals, cube.normals),
-                (self.tex_coords, cube.tex_coords),
-            ]:
-                vbo.write_slice(offset, data)
-
-        elif self.data_size + len(cube.vertices) < self.buffer_size:
-            (offset, size) = self.entities[entity_id] = (self.data_size, len(cube))
-            self.data_size += size
-
-            for (vbo, data) in [
-                (self.vertices, cube.vertices),
-                (self.colors, cube.colors),
-                (self.normals, cube.normals),
-                (self.tex_coords, cube.tex_coords),
-            ]:
-
-                vbo.write_slice(offset, data)
-        else:
-            raise ValueError("Exceeded available size of vertex buffer.")
-
-    def allocate_buffers(self, size):
-        self.buffer_size = size
-        self.data_size = 0
-
-        for (vbo, layout_offset) in [
-            (self.vertices, 0),
-            (self.colors, 1),
-            (self.normals, 2),
-            (self.tex_coords, 3),
-        ]:
-            vbo.write([0] * self.buffer_size)
-            with vbo:
-                gl.glVertexAttribPointer(layout_offset, 3, gl.GL_FLOAT, gl.GL_FALSE, 0, 0)
-                gl.glEnableVertexAttribArray(layout_offset)
+        if entity_id in self.instances:
+            self.instances.release(entity_id)
+
+    def add_entity(self, entity_id, mesh):
+        instances = mesh.instances
+        offset = self.instances.allocate(entity_id, len(instances))
+        self.instances.write(offset, instances)
+
+    def add_cubes(self, entity_ids, instances):
+        # Add many entities of a single cube each.
+        offsets = [self.instances.allocate(entity_id, 1) for entity_id in entity_ids]
+        self.instances.scatter(offsets, instances)
+
+    def compact(self, max_moves=8):
+        self.instances.compact(max_moves)
+
+    def flush(self, budget=None):
+        return self.instances.flush(budget)
 
     def draw(self):
         with self.vao:
-            gl.glDrawArrays(gl.GL_QUADS, 0, self.data_size)
+            gl.glDrawElementsInstanced(
+                gl.GL_TRIANGLES, len(CUBE_INDICES), gl.GL_UNSIGNED_BYTE, None, self.instances.count
+            )
+
+
+# Which meshes a chunk draws: entities without a far mesh are drawn at every
+# distance, the others swap between their near and far meshes.
+ALL = "all"
+NEAR = "near"
+FAR = "far"
+
+
+class DetailLevels:
+    # Distances from the camera in world units. Beyond `far_distance` chunks
+    # draw their far meshes, beyond `shadow_distance` they don't cast shadows,
+    # and beyond `pcf_distance` shadows are a single sample. These can be
+    # changed while running.
+    def __init__(self, far_distance=48.0, shadow_distance=24.0, pcf_distance=16.0):
+        self.far_distance = far_distance
+        self.shadow_distance = shadow_distance
+        self.pcf_distance = pcf_distance
+
+    def scale(self, factor):
+        self.far_distance *= factor
+        self.shadow_distance *= factor
+        self.pcf_distance *= factor
+
+
+class Chunk:
+    # The entities in one chunk, kept in an InstancedScene per level of detail,
+    # with the bounding box around them all.
+    def __init__(self, new_scene):
+        self.new_scene = new_scene
+        self.scenes = {}
+        self.details = {}
+        self.bounds = {}
+        self._box = None
+
+    @property
+    def box(self):
+        if self._box is None:
+            lows = [low for (low, _) in self.bounds.values()]
+            highs = [high for (_, high) in self.bounds.values()]
+            self._box = (np.min(lows, axis=0), np.max(highs, axis=0))
+        return self._box
+
+    def add_entity(self, entity_id, mesh, far_mesh=None):
+        meshes = {ALL: mesh} if far_mesh is None else {NEAR: mesh, FAR: far_mesh}
+        for detail in self.details.get(entity_id, ()):
+            if detail not in meshes:
+                self.scenes[detail].delete_entity(entity_id)
+
+        for (detail, detail_mesh) in meshes.items():
+            if detail not in self.scenes:
+                self.scenes[detail] = self.new_scene()
+            self.scenes[detail].add_entity(entity_id, detail_mesh)
+
+        self.details[entity_id] = tuple(meshes)
+        self.bounds[entity_id] = mesh.bounds()
+        self._box = None
+
+    def add_cubes(self, entity_ids, instances):
+        for entity_id in entity_ids:
+            for detail in self.details.get(entity_id, ()):
+                if detail != ALL:
+                    self.scenes[detail].delete_entity(entity_id)
+            self.details[entity_id] = (ALL,)
+
+        if ALL not in self.scenes:
+            self.scenes[ALL] = self.new_scene()
+        self.scenes[ALL].add_cubes(entity_ids, instances)
+
+        highs = instances["origin"] + instances["size"]
+        for (entity_id, low, high) in zip(entity_ids, instances["origin"], highs):
+            self.bounds[entity_id] = (low, high)
+        self._box = None
+
+    def delete_entity(self, entity_id):
+        for detail in self.details.pop(entity_id, ()):
+            self.scenes[detail].delete_entity(entity_id)
+        del self.bounds[entity_id]
+        self._box = None
+
+    def draw(self, far=False):
+        for detail in (ALL, FAR if far else NEAR):
+            if detail in self.scenes:
+                self.scenes[detail].draw()
+
+
+class ChunkedScene:
+    # Entities split into a grid of square chunks, by the centre of each
+    # entity. Each chunk has its own buffers and bounding box, so drawing with
+    # a view matrix only draws the chunks inside its frustum, and drawing from
+    # a position can pick detail by distance. Chunks are InstancedScenes, or
+    # plain Scenes for geometry that isn't made of cubes.
+    def __init__(self, chunk_size=CHUNK_SIZE, capacity=256, usage=gl.GL_DYNAMIC_DRAW, instanced=True):
+        self.chunk_size = chunk_size
+        self.capacity = capacity
+        self.usage = usage
+        self.instanced = instanced
+        self.cube = UnitCube() if instanced else None
+
+        self.chunks = {}
+        self.entity_chunks = {}
+        self._boxes = None
+
+    def chunk_key(self, mesh):
+        (low, high) = mesh.bounds()
+        centre = (low + high) / 2
+        return (int(centre[0] // self.chunk_size), int(centre[2] // self.chunk_size))
+
+    def new_scene(self):
+        if self.instanced:
+            return InstancedScene(self.capacity, self.usage, self.cube)
+        return Scene(self.capacity, self.usage)
+
+    def add_entity(self, entity_id, mesh, far_mesh=None):
+        key = self.chunk_key(mesh)
+        if self.entity_chunks.get(entity_id, key) != key:
+            self.delete_entity(entity_id)
+
+        if key not in self.chunks:
+            self.chunks[key] = Chunk(self.new_scene)
+        self.chunks[key].add_entity(entity_id, mesh, far_mesh)
+        self.entity_chunks[entity_id] = key
+        self._boxes = None
+
+    def add_cubes(self, entity_ids, instances):
+        # Add many entities of a single cube each, a chunk at a time.
+        centres = instances["origin"][:, [0, 2]] + instances["size"][:, [0, 2]] / 2
+        keys = [tuple(key) for key in (centres // self.chunk_size).astype(int).tolist()]
+
+        groups = {}
+        for (index, (entity_id, key)) in enumerate(zip(entity_ids, keys)):
+            if self.entity_chunks.get(entity_id, key) != key:
+                self.delete_entity(entity_id)
+            self.entity_chunks[entity_id] = key
+            groups.setdefault(key, []).append(index)
+
+        for (key, indices) in groups.items():
+            if key not in self.chunks:
+                self.chunks[key] = Chunk(self.new_scene)
+            self.chunks[key].add_cubes([entity_ids[index] for index in indices], instances[indices])
+        self._boxes = None
+
+    def delete_entity(self, entity_id):
+        key = self.entity_chunks.pop(entity_id, None)
+        if key is not None:
+            self.chunks[key].delete_entity(entity_id)
+            self._boxes = None
+
+    @property
+    def boxes(self):
+        # (chunks, lows, highs) for every chunk with something in it.
+        if self._boxes is None:
+            chunks = [chunk for chunk in self.chunks.values() if chunk.bounds]
+            lows = np.array([chunk.box[0] for chunk in chunks]).reshape(-1, 3)
+            highs = np.array([chunk.box[1] for chunk in chunks]).reshape(-1, 3)
+            self._boxes = (chunks, lows, highs)
+        return self._boxes
+
+    def scenes(self):
+        for chunk in self.chunks.values():
+            yield from chunk.scenes.values()
+
+    def compact(self, max_moves=8):
+        for scene in self.scenes():
+            scene.compact(max_moves)
+
+    def flush(self, budget=None):
+        uploaded = 0
+        for scene in self.scenes():
+            uploaded += scene.flush(None if budget is None else max(budget - uploaded, 0))
+        return uploaded
+
+    def draw(self, matrix=None, position=None, far_distance=math.inf, max_distance=math.inf):
+        (chunks, lows, highs) = self.boxes
+        if matrix is None:
+            visible = np.ones(len(chunks), dtype=bool)
+        else:
+            visible = boxes_visible(frustum_planes(matrix), lows, highs)
+        if position is None:
+            distances = np.zeros(len(chunks))
+        else:
+            distances = box_distances(np.array(tuple(position)), lows, highs)
+
+        for (chunk, inside, distance) in zip(chunks, visible, distances):
+            if inside and distance <= max_distance:
+                chunk.draw(far=distance > far_distance)
+
+
+def set_vertex_attributes(dtype, attributes, divisor=0):
+    for (location, field, gl_type, normalized) in attributes:
+        (field_dtype, field_offset) = dtype.fields[field][:2]
+        size = field_dtype.shape[0] if field_dtype.shape else 1
+        gl.glVertexAttribPointer(location, size, gl_type, normalized, dtype.itemsize, ctypes.c_void_p(field_offset))
+        gl.glEnableVertexAttribArray(location)
+        gl.glVertexAttribDivisor(location, divisor)
 
 
 class VertexArrayObject:
@@ -86,6 +515,11 @@ class VertexArrayObject:
         gl.glBindVertexArray(0)
 
 
+def as_bytes(data):
+    # Zero-copy byte view of any contiguous buffer-protocol object.
+    return np.frombuffer(data, dtype=np.uint8)
+
+
 class VertexBufferObject:
     def __init__(self):
         self._id = gl.GLuint()
@@ -97,130 +531,32 @@ class VertexBufferObject:
     def __exit__(self, exc_type, exc_value, exc_traceback):
         gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
 
-    def write_slice(self, offset, data):
-        with self:
-            gl.glBufferSubData(
-                gl.GL_ARRAY_BUFFER,
-                ctypes.sizeof(gl.GLfloat) * offset,
-                ctypes.sizeof(gl.GLfloat) * len(data),
-                (gl.GLfloat * len(data))(*data),
-            )
+    def bind_elements(self):
+        # The element buffer binding is part of the bound VAO's state, so this
+        # is only unbound by binding another.
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self._id)
 
-    def write(self, data):
+    def write_slice(self, byte_offset, data):
+        data = as_bytes(data)
         with self:
-            gl.glBufferData(
-                gl.GL_ARRAY_BUFFER,
-                ctypes.sizeof(gl.GLfloat) * len(data),
-                (gl.GLfloat * len(data))(*data),
-                gl.GL_DYNAMIC_DRAW,
-            )
+            gl.glBufferSubData(gl.GL_ARRAY_BUFFER, byte_offset, data.nbytes, data.ctypes.data)
 
+    def write(self, data, usage=gl.GL_DYNAMIC_DRAW):
+        data = as_bytes(data)
+        with self:
+            gl.glBufferData(gl.GL_ARRAY_BUFFER, data.nbytes, data.ctypes.data, usage)
 
-def color_to_rgb(color):
-    return (
-        int(color[1:3], 16) / 255,
-        int(color[3:5], 16) / 255,
-        int(color[5:7], 16) / 255,
-    )
-
-
-def tex_coords(x0, x1, y0, y1, texture_index):
-    return [
-        x0,
-        y0,
-        texture_index,
-        x1,
-        y0,
-        texture_index,
-        x1,
-        y1,
-        texture_index,
-        x0,
-        y1,
-        texture_index,
-    ]
-
-
-class Mesh:
-    def __init__(self):
-        self.vertices = []
-        self.colors = []
-        self.normals = []
-        self.tex_coords = []
-
-    def __iadd__(self, other):
-        self.vertices.extend(other.vertices)
-        self.colors.extend(other.colors)
-        self.normals.extend(other.normals)
-        self.tex_coords.extend(other.tex_coords)
-
-        return self
-
-    def __len__(self):
-        return len(self.vertices)
-
-
-class Cube(Mesh):
-    def __init__(
-        self,
-        pos,
-        size=Vector(1, 1, 1),
-        texture=None,
-        color=None,
-        offset=Vector(0, 0, 0),
-    ):
-
-        a = pos + offset - Vector(size.x, 0, size.z) / 2
-        b = a + size
-
-        colors = color_to_rgb(color or "#114433") * 4
-
-        if not texture:
-            texture = tex_coords(0, 1, 0, 1, -1)
-
-        vertices = [
-            (b.x, a.y, a.z, a.x, a.y, a.z, a.x, b.y, a.z, b.x, b.y, a.z),  # Back
-            (a.x, a.y, b.z, b.x, a.y, b.z, b.x, b.y, b.z, a.x, b.y, b.z),  # Front
-            (a.x, a.y, a.z, a.x, a.y, b.z, a.x, b.y, b.z, a.x, b.y, a.z),  # Left
-            (b.x, a.y, b.z, b.x, a.y, a.z, b.x, b.y, a.z, b.x, b.y, b.z),  # Right
-            (a.x, a.y, a.z, b.x, a.y, a.z, b.x, a.y, b.z, a.x, a.y, b.z),  # Bottom
-            (a.x, b.y, b.z, b.x, b.y, b.z, b.x, b.y, a.z, a.x, b.y, a.z),  # Top
-        ]
-
-        normals = [(0, 0, -1), (0, 0, 1), (-1, 0, 0), (1, 0, 0), (0, -1, 0), (0, 1, 0)]
-
-        super().__init__()
-        self.vertices = []
-        self.colors = []
-        self.normals = []
-        self.tex_coords = []
-
-        for (v, n) in zip(vertices, normals):
-            self.vertices.extend(v)
-            self.colors.extend(colors)
-            self.normals.extend(n * 4)
-            self.tex_coords.extend(texture)
-
-
-class Quad:
-    def __init__(self, x0=-1, x1=1, y0=-1, y1=1, depth=-1):
-        self.vertices = [
-            x0,
-            y0,
-            depth,
-            x1,
-            y0,
-            depth,
-            x1,
-            y1,
-            depth,
-            x0,
-            y1,
-            depth,
-        ]
-        self.normals = [0] * 12
-        self.colors = [1.0] * 12
-        self.tex_coords = [0] * 12
-
-    def __len__(self):
-        return len(self.vertices)
+    def allocate(self, nbytes, usage=gl.GL_DYNAMIC_DRAW):
+        with self:
+            gl.glBufferData(gl.GL_ARRAY_BUFFER, nbytes, None, usage)
+
+    def copy_from(self, source, read_offset, write_offset, nbytes):
+        if nbytes:
+            gl.glBindBuffer(gl.GL_COPY_READ_BUFFER, source._id)
+            gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, self._id)
+            gl.glCopyBufferSubData(gl.GL_COPY_READ_BUFFER, gl.GL_COPY_WRITE_BUFFER, read_offset, write_offset, nbytes)
+            gl.glBindBuffer(gl.GL_COPY_READ_BUFFER, 0)
+            gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, 0)
+
+    def delete(self):
+        gl.glDeleteBuffers(1, ctypes.byref(self._id))
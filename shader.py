@@ -70,7 +70,7 @@ class Shader:
     def __setitem__(self, key, value):
         location = self.find_uniform(key)
         if isinstance(value, Matrix):
-            gl.glUniformMatrix4fv(location, 1, gl.GL_FALSE, (gl.GLfloat * 16)(*value))
+            gl.glUniformMatrix4fv(location, 1, gl.GL_FALSE, value.gl_pointer)
         elif isinstance(value, Vector):
             gl.glUniform3f(location, *value)
         elif isinstance(value, float):
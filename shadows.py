@@ -3,7 +3,8 @@ import pyglet.gl as gl
 from vector import Vector
 from matrix import Matrix
 from shader import Shader
-from scene import Scene, Quad
+from scene import Scene
+from mesh import Quad
 
 SHADOW_WIDTH = 2 * 1024
 SHADOW_HEIGHT = 2 * 1024
@@ -15,8 +16,9 @@ SHADOW_DEPTH = 30
 class ShadowQuad:
     def __init__(self):
         self.shader = Shader("shadow_quad")
-        self.scene = Scene(max_vertices=13)
+        self.scene = Scene(max_vertices=4, usage=gl.GL_STATIC_DRAW)
         self.scene.add_entity(1, Quad(0.0, 1, 0, 1))
+        self.scene.flush()
 
     def draw(self, shadow_map):
         self.shader.use()
@@ -62,20 +64,36 @@ class ShadowMap:
         gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
 
         self.shader = Shader("shadows")
+        self.instanced_shader = Shader(vert_path="shadows_instanced.vert.glsl", frag_path="shadows.frag.glsl")
 
+        d = SHADOW_DISTANCE
+        self.ortho_matrix = Matrix.orthographic(-d, d, -d, d, -SHADOW_DEPTH, SHADOW_DEPTH)
+
+        self.sun = None
+        self.model_matrix = None
+        self.rotate_matrix = None
         self.light_space_matrix = None
 
-    def render(self, camera, sun, meshes):
-        d = SHADOW_DISTANCE
-        ortho_matrix = Matrix.orthographic(-d, d, -d, d, -SHADOW_DEPTH, SHADOW_DEPTH)
-        model_matrix = camera.translate
-        rotate_matrix = Matrix.rotate(sun.az.radians, Vector(0, 1, 0)) @ Matrix.rotate(
-            sun.alt.radians, Vector(-1, 0, 0)
-        )
+    def update_light_space_matrix(self, camera, sun):
+        # The sun only moves when the astronomy is recomputed, and the camera
+        # translation is cached until the camera moves, so most frames reuse
+        # the previous light space matrix.
+        if sun is not self.sun:
+            self.sun = sun
+            self.rotate_matrix = Matrix.rotate(sun.az.radians, Vector(0, 1, 0)) @ Matrix.rotate(
+                sun.alt.radians, Vector(-1, 0, 0)
+            )
+            self.light_space_matrix = None
 
-        self.light_space_matrix = model_matrix @ rotate_matrix @ ortho_matrix
-        self.shader.use()
-        self.shader["light_space_matrix"] = self.light_space_matrix
+        if camera.translate is not self.model_matrix:
+            self.model_matrix = camera.translate
+            self.light_space_matrix = None
+
+        if self.light_space_matrix is None:
+            self.light_space_matrix = Matrix.chain(self.model_matrix, self.rotate_matrix, self.ortho_matrix)
+
+    def render(self, camera, sun, meshes, detail):
+        self.update_light_space_matrix(camera, sun)
 
         gl.glViewport(0, 0, SHADOW_WIDTH, SHADOW_HEIGHT)
         gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.buffer_id)
@@ -83,7 +101,10 @@ class ShadowMap:
 
         gl.glCullFace(gl.GL_FRONT)
         for mesh in meshes:
-            mesh.draw()
+            shader = self.instanced_shader if mesh.instanced else self.shader
+            shader.use()
+            shader["light_space_matrix"] = self.light_space_matrix
+            mesh.draw(self.light_space_matrix, camera.position, detail.far_distance, detail.shadow_distance)
         gl.glCullFace(gl.GL_BACK)
 
         gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
@@ -0,0 +1,11 @@
+#version 330 core
+layout (location = 0) in vec3 corner;
+layout (location = 3) in vec3 origin;
+layout (location = 4) in vec3 size;
+
+uniform mat4 light_space_matrix;
+
+void main()
+{
+        gl_Position = light_space_matrix * vec4(origin + corner * size, 1.0);
+}
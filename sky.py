@@ -2,9 +2,11 @@ from math import cos, sin, radians
 from collections import namedtuple
 
 from skyfield import api
+import pyglet.gl as gl
 
 from textures import Texture
-from scene import Scene, Quad
+from scene import Scene
+from mesh import Quad
 from shader import Shader
 from vector import Vector
 from matrix import Matrix
@@ -58,8 +60,9 @@ class Sky:
 
         self.shader = Shader("sky")
 
-        self.scene = Scene(max_vertices=13)
+        self.scene = Scene(max_vertices=4, usage=gl.GL_STATIC_DRAW)
         self.scene.add_entity(1, Quad())
+        self.scene.flush()
 
     def draw(self, camera, astro):
         self.shader.use()
@@ -0,0 +1,94 @@
+import random
+
+from allocator import Allocator
+
+
+def check_invariants(allocator):
+    ranges = sorted(list(allocator.allocations.items()) + list(allocator.free_blocks.items()))
+    position = 0
+    for (offset, size) in ranges:
+        assert offset == position
+        position += size
+    assert position == allocator.end <= allocator.capacity
+
+    free = sorted(allocator.free_blocks.items())
+    for ((offset, size), (next_offset, _)) in zip(free, free[1:]):
+        assert offset + size < next_offset, "adjacent free blocks should be coalesced"
+
+
+def test_bump_allocation():
+    allocator = Allocator(100)
+    assert allocator.allocate(24) == 0
+    assert allocator.allocate(24) == 24
+    assert allocator.end == 48
+
+
+def test_full():
+    allocator = Allocator(48)
+    allocator.allocate(24)
+    allocator.allocate(24)
+    assert allocator.allocate(1) is None
+
+
+def test_reuse_exact_size():
+    allocator = Allocator(100)
+    first = allocator.allocate(24)
+    allocator.allocate(24)
+    allocator.free(first)
+
+    assert allocator.allocate(24) == first
+    assert allocator.end == 48
+
+
+def test_best_fit_splits_block():
+    allocator = Allocator(200)
+    big = allocator.allocate(120)
+    allocator.allocate(24)
+    allocator.free(big)
+
+    assert allocator.allocate(24) == 0
+    assert allocator.free_blocks == {24: 96}
+
+
+def test_free_last_lowers_end():
+    allocator = Allocator(100)
+    first = allocator.allocate(24)
+    second = allocator.allocate(24)
+    allocator.free(first)
+    allocator.free(second)
+
+    assert allocator.end == 0
+    assert allocator.free_blocks == {}
+
+
+def test_move_last_fills_hole():
+    allocator = Allocator(100)
+    first = allocator.allocate(24)
+    allocator.allocate(24)
+    last = allocator.allocate(24)
+    allocator.free(first)
+
+    assert allocator.move_last() == (last, first, 24)
+    assert allocator.end == 48
+    assert allocator.move_last() is None
+
+
+def test_random_workload():
+    rng = random.Random(1)
+    allocator = Allocator(10_000)
+    live = []
+
+    for _ in range(2000):
+        if live and rng.random() < 0.45:
+            allocator.free(live.pop(rng.randrange(len(live))))
+        else:
+            offset = allocator.allocate(rng.choice([4, 24, 24, 24, 120]))
+            if offset is not None:
+                live.append(offset)
+        if rng.random() < 0.2:
+            moved = allocator.move_last()
+            if moved:
+                live[live.index(moved[0])] = moved[1]
+        check_invariants(allocator)
+
+    assert sorted(live) == sorted(allocator.allocations)
@@ -0,0 +1,54 @@
+from camera import Camera
+from matrix import Matrix
+from vector import Vector
+
+
+def make_camera():
+    return Camera(800, 600, Vector(45, 0.6, 53), Vector(0, 90))
+
+
+def test_matrices_cached_while_still():
+    camera = make_camera()
+    mvp = camera.mvp_matrix
+    translate = camera.translate
+
+    camera.update(0.1, Vector(0, 0, 0))
+    camera.update_mouse(Vector(0, 0))
+    camera.resize(800, 600)
+
+    assert camera.mvp_matrix is mvp
+    assert camera.translate is translate
+
+
+def test_move_invalidates_translation_only():
+    camera = make_camera()
+    mvp = camera.mvp_matrix
+    rotate = camera.rotate
+    project = camera.project
+
+    camera.update(0.1, Vector(0, 0, 1))
+
+    assert camera.rotate is rotate
+    assert camera.project is project
+    assert camera.mvp_matrix is not mvp
+    assert camera.translate == Matrix.translate(-camera.position)
+
+
+def test_resize_invalidates_projection():
+    camera = make_camera()
+    project = camera.project
+
+    camera.resize(1024, 768)
+
+    assert camera.project is not project
+    assert camera.project == Matrix.perspective(60, 1024 / 768, 0.1, 500)
+
+
+def test_mouse_invalidates_rotation():
+    camera = make_camera()
+    rotate = camera.rotate
+
+    camera.update_mouse(Vector(1, 2))
+
+    assert camera.rotate is not rotate
+    assert camera.rotation[0] == 1 and camera.rotation[1] == 92
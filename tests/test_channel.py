@@ -0,0 +1,63 @@
+import asyncio
+import threading
+
+from channel import Channel, DeduplicatingChannel
+
+
+def test_wakes_once_per_batch():
+    channel = Channel()
+    wakeups = []
+    channel.put(0)
+    channel.listen(lambda: wakeups.append(True))
+    assert len(wakeups) == 1
+
+    for item in range(1, 4):
+        channel.put(item)
+    assert len(wakeups) == 1
+    assert channel.take() == [0, 1, 2, 3]
+
+    channel.put(4)
+    assert len(wakeups) == 2
+    assert channel.take() == [4]
+    assert channel.stats()["waiting"] == 0
+
+
+def test_batches_from_another_thread():
+    channel = Channel()
+
+    async def main():
+        received = []
+        producer = threading.Thread(target=lambda: [channel.put(item) for item in range(1000)])
+        async for batch in channel.batches():
+            if not received:
+                producer.start()
+            received.extend(batch)
+            if len(received) == 1001:
+                break
+        producer.join()
+        return received
+
+    channel.put("start")
+    received = asyncio.run(main())
+    assert received == ["start"] + list(range(1000))
+    assert channel.stats()["latency_max"] > 0
+
+
+def test_deduplicating_channel():
+    channel = DeduplicatingChannel()
+    for item in [1, 1, 2, 2, 1]:
+        channel.put(item)
+    assert channel.take() == [1, 2, 1]
+
+
+def test_put_after_the_loop_has_closed():
+    channel = Channel()
+
+    async def main():
+        channel.put(0)
+        async for batch in channel.batches():
+            return batch
+
+    assert asyncio.run(main()) == [0]
+    channel.put(1)
+    assert channel.take() == [1]
@@ -0,0 +1,51 @@
+import numpy as np
+
+from compression import compress_dxt5, compress_mipmaps, compressed_size, from_rgb565, mip_chain, mip_sizes
+
+
+def decompress_dxt5(data, width, height):
+    blocks = np.frombuffer(data, "<u8").reshape(-1, 2)
+    pixels = np.zeros((height, width, 4), np.int32)
+    for (i, (alpha_block, colour_block)) in enumerate(blocks.tolist()):
+        (a0, a1) = (alpha_block & 255, (alpha_block >> 8) & 255)
+        alphas = [a0, a1] + [((7 - j) * a0 + j * a1) // 7 for j in range(1, 7)]
+        (e0, e1) = from_rgb565(np.array([colour_block & 0xFFFF, (colour_block >> 16) & 0xFFFF]))
+        colours = [e0, e1, (2 * e0 + e1) // 3, (e0 + 2 * e1) // 3]
+
+        (row, column) = divmod(i, width // 4)
+        for j in range(16):
+            pixel = pixels[4 * row + j // 4, 4 * column + j % 4]
+            pixel[:3] = colours[(colour_block >> (32 + 2 * j)) & 3]
+            pixel[3] = alphas[(alpha_block >> (16 + 3 * j)) & 7]
+    return pixels
+
+
+def test_flat_blocks_are_exact():
+    pixels = np.zeros((4, 8, 4), np.uint8)
+    pixels[:, :4] = (255, 0, 0, 128)
+    pixels[:, 4:] = (0, 255, 255, 0)
+    assert (decompress_dxt5(compress_dxt5(pixels), 8, 4) == pixels).all()
+
+
+def test_gradient_is_close():
+    pixels = np.zeros((8, 8, 4), np.uint8)
+    pixels[..., 0] = np.arange(8) * 32
+    pixels[..., 3] = np.arange(8)[:, None] * 32
+    decoded = decompress_dxt5(compress_dxt5(pixels), 8, 8)
+    assert np.abs(decoded - pixels).max() <= 16
+
+
+def test_mip_chain():
+    pixels = np.zeros((6, 16, 4), np.uint8)
+    levels = mip_chain(pixels)
+    assert [level.shape[:2] for level in levels] == [(6, 16), (3, 8), (1, 4), (1, 2), (1, 1)]
+    assert mip_sizes(16, 6) == [(16, 6), (8, 3), (4, 1), (2, 1), (1, 1)]
+    assert [len(compress_dxt5(level)) for level in levels] == [compressed_size(w, h) for (w, h) in mip_sizes(16, 6)]
+
+
+def test_compressed_mipmaps_are_cached(tmp_path):
+    pixels = np.random.default_rng(1).integers(0, 256, (8, 8, 4), dtype=np.uint8)
+    levels = compress_mipmaps(pixels, directory=tmp_path)
+    assert len(list(tmp_path.iterdir())) == 1
+    assert compress_mipmaps(pixels, directory=tmp_path) == levels
+    assert levels[0] == compress_dxt5(pixels)
@@ -0,0 +1,30 @@
+import numpy as np
+
+from frustum import box_distances, boxes_visible, frustum_planes
+from matrix import Matrix
+from vector import Vector
+
+
+def test_orthographic_frustum():
+    planes = frustum_planes(Matrix.orthographic(-1, 1, -1, 1, -1, 1))
+
+    lows = np.array([(-0.5, -0.5, -0.5), (2, 0, 0), (0.5, 0.5, 0.5), (-3, -3, -3)])
+    highs = np.array([(0.5, 0.5, 0.5), (3, 1, 1), (4, 4, 4), (3, 3, 3)])
+    assert boxes_visible(planes, lows, highs).tolist() == [True, False, True, True]
+
+
+def test_perspective_frustum():
+    # Looking down -z from the origin, through a translated camera.
+    matrix = Matrix.translate(Vector(-10, 0, 0)) @ Matrix.perspective(60, 1, 0.1, 100)
+    planes = frustum_planes(matrix)
+
+    lows = np.array([(9, -1, -11), (9, -1, 5), (9, -1, -200), (50, -1, -11)])
+    highs = np.array([(11, 1, -9), (11, 1, 6), (11, 1, -150), (52, 1, -9)])
+    assert boxes_visible(planes, lows, highs).tolist() == [True, False, False, False]
+
+
+def test_box_distances():
+    lows = np.array([(0, 0, 0), (10, 0, 0), (10, 10, 10)])
+    highs = np.array([(2, 2, 2), (12, 1, 1), (12, 12, 12)])
+    distances = box_distances(np.array([1, 1, 1]), lows, highs)
+    assert np.allclose(distances, [0, 9, np.sqrt(3 * 9**2)])
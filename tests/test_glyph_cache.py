@@ -0,0 +1,41 @@
+import pytest
+
+from glyph_cache import GlyphCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    font = tmp_path / "font.ttf"
+    font.write_bytes(b"font")
+    return GlyphCache(font, 109, directory=tmp_path / "glyphs")
+
+
+def test_store_and_load(cache):
+    assert cache.load("a") is None
+    cache.store("a", 2, 1, bytes(range(8)))
+
+    glyph = cache.load("a")
+    assert (glyph.width, glyph.height) == (2, 1)
+    assert bytes(glyph.get_data("RGBA", 8)) == bytes(range(8))
+    assert "a" in cache and "b" not in cache
+
+
+def test_missing_glyph(cache):
+    cache.store_missing("ab")
+    with pytest.raises(ValueError):
+        cache.load("ab")
+
+
+def test_keyed_by_font_and_size(tmp_path, cache):
+    cache.store("a", 1, 1, bytes(4))
+
+    other_font = tmp_path / "other.ttf"
+    other_font.write_bytes(b"other")
+    assert "a" not in GlyphCache(other_font, 109, directory=cache.directory)
+    assert "a" not in GlyphCache(tmp_path / "font.ttf", 54, directory=cache.directory)
+    assert "a" in GlyphCache(tmp_path / "font.ttf", 109, directory=cache.directory)
+
+
+def test_truncated_file_is_a_miss(cache):
+    cache.store("a", 2, 2, bytes(4))
+    assert cache.load("a") is None
@@ -0,0 +1,40 @@
+import numpy as np
+
+from images import RgbaImage, fit_image, swap_red_blue
+
+
+def test_shrink_averages():
+    pixels = np.zeros((4, 4, 4), dtype=np.uint8)
+    pixels[:2, :2] = 200
+    fitted = fit_image(pixels, 2, 2)
+    assert fitted.shape == (2, 2, 4)
+    assert fitted[..., 0].tolist() == [[200, 0], [0, 0]]
+
+
+def test_crop_to_centre():
+    # A wide image loses its left and right edges.
+    pixels = np.zeros((2, 6, 4), dtype=np.uint8)
+    pixels[:, 2:4] = 255
+    assert (fit_image(pixels, 2, 2) == 255).all()
+
+    tall = np.zeros((6, 2, 4), dtype=np.uint8)
+    tall[2:4] = 255
+    assert (fit_image(tall, 1, 1) == 255).all()
+
+
+def test_enlarge():
+    pixels = np.arange(2 * 2 * 4, dtype=np.uint8).reshape(2, 2, 4)
+    fitted = fit_image(pixels, 4, 4)
+    assert fitted.shape == (4, 4, 4)
+    assert (fitted[:2, :2] == pixels[0, 0]).all()
+    assert (fitted[2:, 2:] == pixels[1, 1]).all()
+
+
+def test_filled():
+    image = RgbaImage.filled(3, 2, (1, 2, 3, 4))
+    assert image.get_data("RGBA", 12) == bytes([1, 2, 3, 4] * 6)
+
+
+def test_swap_red_blue():
+    pixels = np.array([1, 2, 3, 4, 5, 6, 7, 8], dtype=np.uint8)
+    assert swap_red_blue(pixels).tolist() == [3, 2, 1, 4, 7, 6, 5, 8]
@@ -0,0 +1,37 @@
+from ingest import EntityBacklog
+
+
+def test_keeps_latest_update():
+    backlog = EntityBacklog()
+    backlog.extend([{"id": 1, "type": "Avatar", "x": x} for x in range(5)])
+    backlog.extend([{"id": 2, "type": "Wall"}, {"id": 1, "type": "Avatar", "x": 5}])
+
+    assert len(backlog) == 2
+    assert backlog.take(10) == [{"id": 2, "type": "Wall"}, {"id": 1, "type": "Avatar", "x": 5}]
+    assert backlog.stats()["coalesced"] == 5
+
+
+def test_deletes_stay_ordered():
+    backlog = EntityBacklog()
+    update = {"id": 1, "type": "Wall"}
+    delete = {"id": 1, "type": "Wall", "deleted": True}
+
+    backlog.extend([update, delete])
+    assert backlog.take(1) == [delete]
+
+    backlog.extend([update, delete, update, update])
+    assert backlog.take(1) == [delete, update]
+
+
+def test_photos_are_kept_apart_from_their_avatars():
+    backlog = EntityBacklog()
+    backlog.extend([{"id": 1, "type": "Avatar"}, {"id": 1, "type": "Photo"}])
+    assert len(backlog) == 2
+
+
+def test_take_in_batches():
+    backlog = EntityBacklog()
+    backlog.extend([{"id": i, "type": "Note"} for i in range(5)])
+    assert [entity["id"] for entity in backlog.take(3)] == [0, 1, 2]
+    assert [entity["id"] for entity in backlog.take(3)] == [3, 4]
+    assert backlog.stats()["peak"] == 5
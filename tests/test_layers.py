@@ -0,0 +1,40 @@
+import pytest
+
+from layers import LayerAllocator, LayersFull
+
+
+def test_grows_to_max_capacity():
+    layers = LayerAllocator(2, 5)
+    assert [layers.allocate(name) for name in "abcde"] == [0, 1, 2, 3, 4]
+    assert layers.capacity == 5
+
+
+def test_evicts_least_recently_used():
+    layers = LayerAllocator(3)
+    for name in "abc":
+        layers.allocate(name)
+
+    assert layers.lookup("a") == 0
+    assert layers.lookup("z") is None
+    assert layers.allocate("d") == 1
+    assert "b" not in layers
+    assert layers.stats() == {"layers": 3, "capacity": 3, "hits": 1, "misses": 1, "evictions": 1}
+
+
+def test_referenced_layers_are_kept():
+    layers = LayerAllocator(2)
+    layers.allocate("a")
+    layers.allocate("b")
+    layers.reference("a", 1)
+    layers.reference("b", 2)
+
+    with pytest.raises(LayersFull):
+        layers.allocate("c")
+
+    # Moving user 1 to another texture releases "a".
+    layers.reference("b", 1)
+    assert layers.allocate("c") == 0
+
+    layers.release(1)
+    layers.release(2)
+    assert layers.allocate("d") == 1
@@ -85,3 +85,16 @@ def test_translate():
 def test_orthographic():
     expected = Matrix((0.002, 0, 0, 0), (0, 0.005, 0, 0), (0, 0, 0.05, 0), (-1.0, -2.0, 0, 1.0))
     assert Matrix.orthographic(0, 1000, 200, 600, -20, 20) == expected
+
+
+def test_chain():
+    a = Matrix.rotate(math.pi / 3, Vector(1, 2, 3))
+    b = Matrix.translate(Vector(4, 5, 6))
+    c = Matrix.perspective(60, 1.5, 0.1, 500)
+    assert approx_equal(Matrix.chain(a, b, c), a @ b @ c)
+
+
+def test_gl_pointer():
+    x = Matrix((1, 2, 3, 4), (5, 6, 7, 8), (9, 10, 11, 12), (13, 14, 15, 16))
+    pointer = x.gl_pointer
+    assert [pointer[i] for i in range(16)] == x.values() == list(range(1, 17))
@@ -0,0 +1,145 @@
+import pytest
+import numpy as np
+
+from mesh import (
+    DEFAULT_COLOR,
+    DEFAULT_TEXTURE,
+    INSTANCE_DTYPE,
+    VERTEX_DTYPE,
+    Cube,
+    Mesh,
+    MeshTemplates,
+    Quad,
+    color_to_rgb,
+    cube_instances,
+    instance_bounds,
+    tex_coords,
+)
+from vector import Vector
+
+
+def test_vertex_is_compact():
+    assert VERTEX_DTYPE.itemsize == 24
+
+
+def test_cube_bounds():
+    cube = Cube(Vector(10, 0, 20), Vector(2, 3, 4), offset=Vector(0, 1, 0))
+
+    assert len(cube) == 24
+    assert cube.data["position"].min(axis=0).tolist() == [9, 1, 18]
+    assert cube.data["position"].max(axis=0).tolist() == [11, 4, 22]
+
+
+def test_cube_faces_point_outwards():
+    cube = Cube(Vector(0, 0, 0), Vector(2, 2, 2))
+    centre = np.array([0, 1, 0])
+
+    for face in cube.data.reshape(6, 4):
+        normal = face["normal"][0] / 127
+        assert np.dot(face["position"].mean(axis=0) - centre, normal) == 1
+
+
+def test_cube_color_and_texture():
+    cube = Cube(Vector(0, 0, 0), color="#ff8000", texture=tex_coords(0, 1000.5, 0, 2, 7))
+
+    assert cube.data["color"].tolist() == [[255, 128, 0]] * 24
+    assert cube.data["tex_coords"][:4].tolist() == [[0, 0, 7], [1000.5, 0, 7], [1000.5, 2, 7], [0, 2, 7]]
+
+
+def test_mesh_concatenates():
+    mesh = Mesh()
+    mesh += Cube(Vector(0, 0, 0))
+    mesh += Quad()
+
+    assert len(mesh) == 28
+
+
+def test_cube_instance():
+    cube = Cube(Vector(10, 0, 20), Vector(2, 3, 4), color="#ff8000", texture=tex_coords(0, 6, 0, 4, 3))
+    (instance,) = cube.instances
+
+    assert instance["origin"].tolist() == [9, 0, 18]
+    assert instance["size"].tolist() == [2, 3, 4]
+    assert instance["tex_rect"].tolist() == [0, 6, 0, 4]
+    assert instance["color"].tolist() == [255, 128, 0]
+    assert instance["layer"] == 3
+
+
+def test_mesh_of_cubes_is_instanced():
+    mesh = Mesh()
+    for x in range(5):
+        mesh += Cube(Vector(x, 0, 0))
+
+    assert len(mesh.instances) == 5
+    assert len(mesh.data) == len(mesh) == 5 * 24
+
+
+def test_mixed_mesh_is_not_instanced():
+    mesh = Mesh()
+    mesh += Cube(Vector(0, 0, 0))
+    mesh += Quad()
+
+    with pytest.raises(ValueError):
+        mesh.instances
+
+
+def test_indexed_quads():
+    (vertices, indices) = Quad(0, 1, 0, 1).indexed()
+
+    assert len(vertices) == 4
+    assert sorted(vertices["position"][indices[:3]].tolist()) == [[0, 0, -1], [1, 0, -1], [1, 1, -1]]
+    assert len(indices) == 6
+
+
+def test_indexed_shares_duplicate_vertices():
+    mesh = Mesh()
+    mesh += Cube(Vector(0, 0, 0))
+    mesh += Cube(Vector(0, 0, 0))
+
+    (vertices, indices) = mesh.indexed()
+    assert len(vertices) == 24
+    assert len(indices) == 2 * 36
+    assert (vertices[indices[:36]] == vertices[indices[36:]]).all()
+
+
+def test_instance_bounds():
+    mesh = Cube(Vector(10, 0, 20), Vector(2, 1, 4))
+    mesh += Cube(Vector(0, 0, 0))
+    (low, high) = instance_bounds(mesh.instances)
+    assert low.tolist() == [-0.5, 0, -0.5]
+    assert high.tolist() == [11, 1, 22]
+
+
+def test_cube_instances_match_cubes():
+    texture = tex_coords(0, 1, 1, 0, 3)
+    cubes = Mesh()
+    cubes += Cube(Vector(1, 0, 2), Vector(0.6, 0.6, 0.6), color="#0000ff", texture=texture)
+    cubes += Cube(Vector(5, 0, 7), Vector(3, 0.002, 2), offset=Vector(1, 0, 0.5))
+
+    instances = cube_instances(
+        [(1, 0, 2), (5, 0, 7)],
+        [(0.6, 0.6, 0.6), (3, 0.002, 2)],
+        [(0, 0, 255), color_to_rgb(DEFAULT_COLOR)],
+        [texture, DEFAULT_TEXTURE],
+        [(0, 0, 0), (1, 0, 0.5)],
+    )
+    for field in INSTANCE_DTYPE.names:
+        assert instances[field].tolist() == cubes.instances[field].tolist()
+
+
+def test_mesh_templates():
+    templates = MeshTemplates(max_size=2)
+    build = lambda: Cube(Vector(0, 0, 0), Vector(2, 1, 2))
+
+    first = templates.instantiate("box", Vector(10, 0, 20), build)
+    second = templates.instantiate("box", Vector(1, 0, 1), build)
+    assert (templates.hits, templates.misses) == (1, 1)
+
+    assert first.instances["origin"].tolist() == [[9, 0, 19]]
+    expected = Cube(Vector(1, 0, 1), Vector(2, 1, 2)).instances
+    for field in INSTANCE_DTYPE.names:
+        assert second.instances[field].tolist() == expected[field].tolist()
+
+    templates.instantiate("a", Vector(0, 0, 0), build)
+    templates.instantiate("b", Vector(0, 0, 0), build)
+    assert list(templates.templates) == ["a", "b"]
@@ -0,0 +1,70 @@
+import asyncio
+
+from photos import PhotoFetcher
+
+
+def test_fetches_each_photo_once_with_bounded_concurrency():
+    fetching = set()
+    fetches = []
+    ready = []
+
+    async def fetch(avatar_id, image_path):
+        fetching.add(avatar_id)
+        fetches.append((avatar_id, len(fetching)))
+        await asyncio.sleep(0.01)
+        fetching.discard(avatar_id)
+        return image_path.encode()
+
+    async def main():
+        fetcher = PhotoFetcher(fetch, lambda avatar_id, data: ready.append((avatar_id, data)), concurrency=2)
+        for avatar_id in [1, 2, 1, 3, 2]:
+            fetcher.request(avatar_id, f"photo{avatar_id}")
+        await asyncio.gather(*fetcher.tasks.values())
+        fetcher.request(1, "photo1")
+        assert not fetcher.tasks
+
+    asyncio.run(main())
+    assert sorted(avatar_id for (avatar_id, _) in fetches) == [1, 2, 3]
+    assert max(concurrent for (_, concurrent) in fetches) == 2
+    assert sorted(ready) == [(1, b"photo1"), (2, b"photo2"), (3, b"photo3")]
+
+
+def test_failed_fetch_is_not_fatal():
+    ready = []
+
+    async def fetch(avatar_id, image_path):
+        if avatar_id == 1:
+            raise OSError("Unreachable")
+        return b"photo"
+
+    async def main():
+        fetcher = PhotoFetcher(fetch, lambda avatar_id, data: ready.append(avatar_id))
+        fetcher.request(1, "")
+        fetcher.request(2, "")
+        await asyncio.gather(*fetcher.tasks.values())
+
+    asyncio.run(main())
+    assert ready == [2]
+
+
+def test_failed_fetch_is_retried_on_the_next_request():
+    attempts = []
+    ready = []
+
+    async def fetch(avatar_id, image_path):
+        attempts.append(avatar_id)
+        if len(attempts) == 1:
+            raise OSError("Unreachable")
+        return b"photo"
+
+    async def main():
+        fetcher = PhotoFetcher(fetch, lambda avatar_id, data: ready.append(avatar_id))
+        fetcher.request(1, "")
+        await asyncio.gather(*fetcher.tasks.values())
+        fetcher.request(1, "")
+        await asyncio.gather(*fetcher.tasks.values())
+        fetcher.request(1, "")
+        assert not fetcher.tasks
+
+    asyncio.run(main())
+    assert (attempts, ready) == ([1, 1], [1])
@@ -0,0 +1,119 @@
+import asyncio
+
+from publisher import AvatarPublisher
+
+
+def test_positions_are_latest_wins():
+    sent = []
+
+    async def send_position(position):
+        sent.append(position)
+        await asyncio.sleep(0.01)
+
+    async def main():
+        publisher = AvatarPublisher(max_rate=50)
+        task = publisher.start(send_position, None)
+        for x in range(10):
+            publisher.put({"type": "pos", "payload": {"x": x}})
+        await asyncio.sleep(0.005)
+        for x in range(10, 20):
+            publisher.put({"type": "pos", "payload": {"x": x}})
+        await asyncio.sleep(0.1)
+        task.cancel()
+        return publisher.stats()
+
+    stats = asyncio.run(main())
+    assert sent == [{"x": 9}, {"x": 19}]
+    assert (stats["positions_sent"], stats["positions_dropped"]) == (2, 18)
+    assert stats["position_latency_max"] > 0
+    assert stats["command_latency_max"] == 0
+
+
+def test_commands_are_sent_in_order_beside_positions():
+    sent = []
+
+    async def send_position(position):
+        await asyncio.sleep(1)
+
+    async def send_command(message):
+        if message["payload"] == 1:
+            raise OSError("Unreachable")
+        sent.append(message["payload"])
+
+    async def main():
+        publisher = AvatarPublisher()
+        task = publisher.start(send_position, send_command)
+        publisher.put({"type": "pos", "payload": {"x": 0}})
+        for n in range(3):
+            publisher.put({"type": "wall", "payload": n})
+        await asyncio.sleep(0.05)
+        task.cancel()
+        return publisher.stats()
+
+    stats = asyncio.run(main())
+    assert sent == [0, 2]
+    assert (stats["commands_sent"], stats["commands_queued"]) == (2, 0)
+    assert stats["position_latency_max"] == 0
+
+
+def test_command_can_send_the_waiting_position_first():
+    sent = []
+
+    async def send_position(position):
+        sent.append(position)
+        await asyncio.sleep(0.01)
+
+    async def send_command(message):
+        await publisher.send_latest_position()
+        sent.append(message["type"])
+
+    publisher = AvatarPublisher(max_rate=1)
+
+    async def main():
+        task = publisher.start(send_position, send_command)
+        publisher.put({"type": "pos", "payload": 1})
+        await asyncio.sleep(0.005)
+        publisher.put({"type": "pos", "payload": 2})
+        publisher.put({"type": "wall", "payload": {}})
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(main())
+    assert sent == [1, 2, "wall"]
+
+
+def test_drain_sends_what_is_waiting():
+    sent = []
+
+    async def send_position(position):
+        sent.append(position)
+
+    async def send_command(message):
+        await asyncio.sleep(0.01)
+        sent.append(message["payload"])
+
+    async def hang(message):
+        await asyncio.sleep(1)
+
+    async def main():
+        publisher = AvatarPublisher(max_rate=1)
+        task = publisher.start(send_position, send_command)
+        publisher.put({"type": "pos", "payload": 1})
+        await asyncio.sleep(0.005)
+        publisher.put({"type": "pos", "payload": 2})
+        for n in range(3):
+            publisher.put({"type": "wall", "payload": n})
+        await publisher.drain()
+        task.cancel()
+
+        stuck = AvatarPublisher()
+        task = stuck.start(send_position, hang)
+        stuck.put({"type": "wall", "payload": 0})
+        stuck.put({"type": "wall", "payload": 1})
+        await stuck.drain(timeout=0.05)
+        task.cancel()
+        return stuck.stats()
+
+    stats = asyncio.run(main())
+    assert sent == [1, 2, 0, 1, 2]
+    assert stats["commands_queued"] == 1
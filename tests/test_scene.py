@@ -0,0 +1,29 @@
+import numpy as np
+
+from benchmarks import fake_gl
+
+fake_gl.install()
+
+from scene import INDEX_DTYPE, SlotBuffer, blank_indices
+
+
+def test_reused_slots_are_drawn_once_uploaded():
+    buffer = SlotBuffer(INDEX_DTYPE, 16, lambda: None, blank=blank_indices)
+    for key in range(3):
+        buffer.write(buffer.allocate(key, 4), np.full(4, key + 1))
+    buffer.flush()
+    assert buffer.count == 12
+
+    # The GPU still holds key 2's indices where key 3 goes.
+    buffer.release(2)
+    assert buffer.count == 8
+    assert buffer.allocate(3, 4) == 8
+    buffer.write(8, np.full(4, 4))
+    assert buffer.count == 8
+
+    buffer.flush(budget=0)
+    assert buffer.count == 8
+    buffer.flush(budget=2 * INDEX_DTYPE.itemsize)
+    assert buffer.count == 10
+    buffer.flush(budget=2 * INDEX_DTYPE.itemsize)
+    assert buffer.count == 12
@@ -0,0 +1,109 @@
+import os
+
+from thumbnails import ThumbnailStore, photo_hash
+
+
+def blob(value):
+    return bytes([value]) * 16
+
+
+def open_store(tmp_path, max_bytes=1024):
+    return ThumbnailStore(str(tmp_path / "thumbnails.pack"), width=2, height=2, max_bytes=max_bytes)
+
+
+def test_put_and_get(tmp_path):
+    store = open_store(tmp_path)
+    source = photo_hash(b"photo")
+    store.put(1, source, blob(1))
+    store.put(2, "other", blob(2))
+
+    assert store.get(1) == blob(1)
+    assert store.get(1, source) == blob(1)
+    assert store.get(1, "changed") is None
+    assert store.get(3) is None
+    assert store.avatar_ids() == [1, 2]
+
+
+def test_reopen(tmp_path):
+    store = open_store(tmp_path)
+    store.put(1, "a", blob(1))
+    store.put(1, "b", blob(3))
+    store.close()
+
+    store = open_store(tmp_path)
+    assert store.get(1, "b") == blob(3)
+    assert store.slots == 1
+
+
+def test_evicts_least_recently_used(tmp_path):
+    store = open_store(tmp_path, max_bytes=32)
+    store.put(1, "a", blob(1))
+    store.put(2, "a", blob(2))
+    store.get(1)
+    store.put(3, "a", blob(3))
+
+    assert 2 not in store
+    assert (store.get(1), store.get(3)) == (blob(1), blob(3))
+
+    # The evicted slot is reused once the saved index no longer names it.
+    assert store.slots == 3
+    store.flush_index()
+    store.put(4, "a", blob(4))
+    assert store.slots == 3
+    assert (store.get(3), store.get(4)) == (blob(3), blob(4))
+
+
+def test_index_is_saved_when_flushed(tmp_path):
+    store = open_store(tmp_path)
+    store.put(1, "a", blob(1))
+    store.put(2, "a", blob(2))
+    assert not os.path.exists(store.index_path)
+
+    store.flush_index(max_age=60)
+    assert not os.path.exists(store.index_path)
+    store.flush_index()
+    assert open_store(tmp_path).avatar_ids() == [2, 1]
+
+
+def test_slots_dropped_on_opening_are_reused(tmp_path):
+    store = open_store(tmp_path)
+    for avatar_id in range(4):
+        store.put(avatar_id, "a", blob(avatar_id))
+    store.close()
+
+    store = open_store(tmp_path, max_bytes=32)
+    assert store.avatar_ids() == [3, 2]
+    store.put(4, "a", blob(4))
+    store.put(5, "a", blob(5))
+    assert store.slots == 4
+    assert (store.get(4), store.get(5)) == (blob(4), blob(5))
+
+
+def test_compact(tmp_path):
+    store = open_store(tmp_path)
+    for avatar_id in range(4):
+        store.put(avatar_id, "a", blob(avatar_id))
+    store.close()
+
+    # A smaller budget evicts down to two thumbnails, leaving free slots.
+    store = open_store(tmp_path, max_bytes=32)
+    store.put(0, "b", blob(9))
+    store.flush_index()
+    store.put(4, "a", blob(4))
+    store.put(5, "a", blob(5))
+    assert store.slots == 4
+
+    assert store.compact() == 2 * 16
+    assert os.path.getsize(store.path) == 2 * 16
+    assert (store.get(4), store.get(5)) == (blob(4), blob(5))
+
+
+def test_recently_used_order_is_saved(tmp_path):
+    store = open_store(tmp_path)
+    store.put(1, "a", blob(1))
+    store.put(2, "a", blob(2))
+    store.flush_index()
+
+    store.get(1)
+    store.flush_index()
+    assert open_store(tmp_path).avatar_ids() == [1, 2]
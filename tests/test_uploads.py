@@ -0,0 +1,72 @@
+import numpy as np
+
+from uploads import StagingBuffer, UploadQueue, merge_ranges
+
+
+def test_merge_ranges():
+    assert merge_ranges([(10, 20), (0, 5), (5, 8), (15, 25)]) == [(0, 8), (10, 25)]
+    assert merge_ranges([(0, 5), (7, 9)], gap=2) == [(0, 9)]
+
+
+def test_writes_are_coalesced():
+    staging = StagingBuffer(np.dtype(np.uint32), 1000)
+    for offset in range(0, 100, 4):
+        staging.write(offset, np.arange(4, dtype=np.uint32))
+
+    ((offset, data),) = staging.take()
+    assert offset == 0
+    assert len(data) == 100
+    assert staging.take() == []
+
+
+def test_budget_leaves_remainder_dirty():
+    staging = StagingBuffer(np.dtype(np.uint32), 10_000)
+    staging.write(0, np.ones(2000, dtype=np.uint32))
+    staging.write(5000, np.ones(10, dtype=np.uint32))
+
+    uploads = staging.take(budget=4000)
+    assert [(offset, len(data)) for (offset, data) in uploads] == [(0, 1000)]
+    assert staging.pending_bytes == 1010 * 4
+
+    uploads = staging.take(budget=8000)
+    assert [(offset, len(data)) for (offset, data) in uploads] == [(1000, 1000), (5000, 10)]
+
+
+def test_move():
+    staging = StagingBuffer(np.dtype(np.uint32), 100)
+    staging.write(50, np.arange(10, dtype=np.uint32))
+    staging.take()
+
+    staging.move(50, 0, 10)
+    ((offset, data),) = staging.take()
+    assert offset == 0
+    assert data.tolist() == list(range(10))
+
+
+def test_mark_clean():
+    staging = StagingBuffer(np.dtype(np.uint32), 100)
+    assert not staging.mark_clean()
+
+    staging.write(10, np.ones(5, dtype=np.uint32))
+    assert staging.mark_clean()
+    assert staging.pending_bytes == 0
+    assert staging.take() == []
+
+
+def test_scatter():
+    staging = StagingBuffer(np.dtype(np.uint32), 100)
+    staging.scatter([7, 3, 4], np.array([70, 30, 40], dtype=np.uint32))
+
+    assert staging.data[[3, 4, 7]].tolist() == [30, 40, 70]
+    assert [(offset, len(data)) for (offset, data) in staging.take()] == [(3, 5)]
+
+
+def test_upload_queue_budget():
+    queue = UploadQueue()
+    for name in "abc":
+        queue.put(name, 40)
+
+    assert queue.take(100) == [(0, "a"), (40, "b")]
+    assert (len(queue), queue.pending_bytes) == (1, 40)
+    assert queue.take(10) == [(0, "c")]
+    assert queue.take(100) == []
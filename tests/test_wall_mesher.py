@@ -0,0 +1,59 @@
+from mesh import tex_coords
+from wall_mesher import WallMesher, greedy_rectangles
+
+
+def quads(mesh):
+    return len(mesh.data) // 4
+
+
+def test_greedy_rectangles():
+    cells = {(x, z): "red" for x in range(3) for z in range(2)}
+    cells[(3, 0)] = "blue"
+    cells[(4, 0)] = None
+    cells[(5, 0)] = None
+    assert sorted(greedy_rectangles(cells)) == [(0, 0, 3, 2), (3, 0, 1, 1), (4, 0, 1, 1), (5, 0, 1, 1)]
+
+
+def test_row_of_walls_is_one_box():
+    mesher = WallMesher()
+    for x in range(10):
+        mesher.add_wall(x, x, 7, "#919c9c")
+
+    mesh = mesher.take_dirty()[(0, 0)]
+    assert quads(mesh) == 6
+
+    (low, high) = mesh.bounds()
+    assert low.tolist() == [-0.5, 0, 6.5]
+    assert high.tolist() == [9.5, 1, 7.5]
+
+
+def test_text_and_colours_are_not_merged():
+    mesher = WallMesher()
+    mesher.add_wall(1, 0, 0, "#919c9c")
+    mesher.add_wall(2, 1, 0, "#d95a88")
+    mesher.add_wall(3, 2, 0, "#919c9c", tex_coords(0, 1, 1, 0, 4))
+
+    # Each wall keeps its own back, front, bottom and top, and only the two
+    # ends have side faces.
+    assert quads(mesher.take_dirty()[(0, 0)]) == 3 * 4 + 2
+
+
+def test_updates_touch_neighbouring_blocks():
+    mesher = WallMesher(block_size=16)
+    mesher.add_wall(1, 15, 3, "#919c9c")
+    assert set(mesher.take_dirty()) == {(0, 0), (1, 0)}
+
+    mesher.add_wall(2, 5, 5, "#919c9c")
+    mesher.take_dirty()
+    mesher.delete_wall(2)
+    mesher.delete_wall(1)
+    dirty = mesher.take_dirty()
+    assert dirty == {(0, 0): None, (1, 0): None}
+
+
+def test_adding_a_wall_returns_the_one_it_replaced():
+    mesher = WallMesher()
+    assert mesher.add_wall(1, 0, 0, "#919c9c") is None
+    assert mesher.add_wall(1, 1, 0, "#919c9c") is None
+    assert mesher.add_wall(2, 1, 0, "#d95a88") == 1
+    assert 1 not in mesher.walls
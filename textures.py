@@ -1,13 +1,43 @@
-from copy import copy
+from concurrent.futures import ThreadPoolExecutor
+import ctypes
 import io
+import numpy as np
 import pyglet
 import pyglet.gl as gl
 
 import freetype2
 from freetype2 import FT
 
+from compression import compress_mipmaps, compressed_size, mip_sizes
+from glyph_cache import GlyphCache
+from images import RgbaImage, fit_image, swap_red_blue
+from layers import LayerAllocator
+from uploads import UploadQueue
+
+# Bytes of texture layers sent to the GPU each frame. More waits for the next.
+TEXTURE_UPLOAD_BUDGET = 1024 * 1024
+
+# Bytes per pixel of the internal formats TextureCube takes.
+FORMAT_BYTES = {
+    gl.GL_RGBA8: 4,
+    gl.GL_SRGB8_ALPHA8: 4,
+    gl.GL_RGB8: 3,
+    gl.GL_SRGB8: 3,
+    gl.GL_COMPRESSED_RGBA_S3TC_DXT5_EXT: 1,
+}
+COMPRESSED_FORMATS = {gl.GL_COMPRESSED_RGBA_S3TC_DXT5_EXT}
+
+GLYPH_SIZE = 109
+
 EMOJI_FACE = freetype2.get_default_lib().find_face("NotoColorEmoji")
-EMOJI_FACE.set_pixel_sizes(109, 109)
+EMOJI_FACE.set_pixel_sizes(GLYPH_SIZE, GLYPH_SIZE)
+GLYPH_CACHE = GlyphCache(EMOJI_FACE.filename, GLYPH_SIZE)
+
+# What bots and wall text are usually made of, for prewarm_glyphs.
+COMMON_GLYPHS = (
+    "🤖👾🚀🌈🔥⭐🌟✨❤💜💚💙💛🧡🖤🤍🎉🎈🎨🎵🐍🦀🐢🐱🐶🦊🐸🐙🦄🍕🍩☕🌵🌻🌙☀"
+    + "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+)
 
 TEXT_FACE = freetype2.get_default_lib().find_face("Ubuntu")
 TEXT_FACE.set_pixel_sizes(109, 109)
@@ -33,7 +63,7 @@ class Texture:
         gl.glTexImage2D(
             gl.GL_TEXTURE_2D,
             0,
-            gl.GL_RGB,
+            gl.GL_RGB8,
             self.width,
             self.height,
             0,
@@ -51,49 +81,152 @@ class Texture:
         self.bind()
 
 
+def max_array_layers():
+    # GL 3.3 only promises 256 layers, which is also the answer without a
+    # context to ask.
+    layers = gl.GLint()
+    gl.glGetIntegerv(gl.GL_MAX_ARRAY_TEXTURE_LAYERS, layers)
+    return layers.value or 256
+
+
 class TextureCube:
-    def __init__(self, width, height, max_textures, pixel_format=gl.GL_RGBA):
+    # A texture array of `layers` layers, which grows to fit up to
+    # `memory_budget` bytes and then reuses the layers of textures that are no
+    # longer referenced. See LayerAllocator.
+    #
+    # With an `uploader`, layers are sent through it rather than straight from
+    # client memory, and textures are `pending` until they've been sent.
+    #
+    # Compressed arrays are compressed on the CPU, with their mipmaps, as
+    # textures are added. They're meant for static textures and don't grow.
+    def __init__(
+        self,
+        width,
+        height,
+        layers,
+        pixel_format=gl.GL_RGBA,
+        memory_budget=None,
+        uploader=None,
+        internal_format=gl.GL_RGBA8,
+    ):
         self.width = width
         self.height = height
-        self.max_textures = max_textures
         self.pixel_format = pixel_format
-
-        self.next_index = 0
-        self.textures = {}
-
-        self._id = gl.GLuint()
-        gl.glGenTextures(1, self._id)
-
-        self.bind()
+        self.internal_format = internal_format
+        self.compressed = internal_format in COMPRESSED_FORMATS
+        self.border_color = None
+        self.uploader = uploader
+        self.pending = set()
+
+        if self.compressed:
+            memory_budget = None
+        max_layers = memory_budget and min(memory_budget // self.layer_bytes(), max_array_layers())
+        self.layers = LayerAllocator(layers, max_layers)
+
+        self.allocated_layers = layers
+        self._id = self.create(layers)
+        self.mipmaps_dirty = False
+
+    def create(self, layers):
+        texture_id = gl.GLuint()
+        gl.glGenTextures(1, texture_id)
+        gl.glBindTexture(gl.GL_TEXTURE_2D_ARRAY, texture_id)
 
         gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
         gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
-
-        gl.glTexImage3D(
-            gl.GL_TEXTURE_2D_ARRAY,
-            0,
-            gl.GL_RGBA,
-            self.width,
-            self.height,
-            self.max_textures,
-            0,
-            self.pixel_format,
-            gl.GL_UNSIGNED_BYTE,
-            None,
-        )
+        if self.border_color:
+            self.set_border()
+
+        if self.compressed:
+            for (level, (width, height)) in enumerate(mip_sizes(self.width, self.height)):
+                gl.glCompressedTexImage3D(
+                    gl.GL_TEXTURE_2D_ARRAY,
+                    level,
+                    self.internal_format,
+                    width,
+                    height,
+                    layers,
+                    0,
+                    compressed_size(width, height) * layers,
+                    None,
+                )
+        else:
+            gl.glTexImage3D(
+                gl.GL_TEXTURE_2D_ARRAY,
+                0,
+                self.internal_format,
+                self.width,
+                self.height,
+                layers,
+                0,
+                self.pixel_format,
+                gl.GL_UNSIGNED_BYTE,
+                None,
+            )
+        return texture_id
+
+    def layer_bytes(self):
+        if self.compressed:
+            return sum(compressed_size(width, height) for (width, height) in mip_sizes(self.width, self.height))
+        # Mipmaps add a third to every layer.
+        return self.width * self.height * FORMAT_BYTES[self.internal_format] * 4 // 3
+
+    def memory_bytes(self):
+        return self.allocated_layers * self.layer_bytes()
+
+    def grow(self):
+        # Copy the layers into a bigger array, on the GPU, by reading each one
+        # through a framebuffer.
+        layers = self.layers.capacity
+        texture_id = self.create(layers)
+
+        framebuffer = gl.GLuint()
+        gl.glGenFramebuffers(1, framebuffer)
+        gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, framebuffer)
+        gl.glReadBuffer(gl.GL_COLOR_ATTACHMENT0)
+        for layer in range(self.allocated_layers):
+            gl.glFramebufferTextureLayer(gl.GL_READ_FRAMEBUFFER, gl.GL_COLOR_ATTACHMENT0, self._id, 0, layer)
+            gl.glCopyTexSubImage3D(gl.GL_TEXTURE_2D_ARRAY, 0, 0, 0, layer, 0, 0, self.width, self.height)
+        gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, 0)
+        gl.glDeleteFramebuffers(1, framebuffer)
+        self.mipmaps_dirty = True
+
+        gl.glDeleteTextures(1, self._id)
+        self._id = texture_id
+        self.allocated_layers = layers
 
     def clamp_border(self, color):
+        self.border_color = color
         self.bind()
+        self.set_border()
 
+    def set_border(self):
         gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_BORDER)
         gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_BORDER)
-        gl.glTexParameterfv(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_BORDER_COLOR, (gl.GLfloat * 3)(*color))
+        gl.glTexParameterfv(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_BORDER_COLOR, (gl.GLfloat * 3)(*self.border_color))
+
+    def lookup(self, texture):
+        layer = self.layers.lookup(texture)
+        return None if texture in self.pending else layer
+
+    def ready(self, texture):
+        return texture in self.layers and texture not in self.pending
 
-    def index(self, texture):
-        return self.textures[texture]
+    def index(self, texture, user=None):
+        # The texture's layer. A `user` keeps the layer from being reused
+        # until it's released or references another texture.
+        if user is not None:
+            self.layers.reference(texture, user)
+        return self.layers[texture]
+
+    def release(self, user):
+        self.layers.release(user)
+
+    def stats(self):
+        return {**self.layers.stats(), "bytes": self.memory_bytes()}
 
     def add_texture_png(self, texture, texture_image=None):
-        if not texture in self.textures:
+        if self.layers.lookup(texture) is None:
             if texture_image:
                 texture_image = io.BytesIO(texture_image)
 
@@ -101,33 +234,77 @@ class TextureCube:
             self.add_texture(texture, texture_image)
 
     def add_texture_glyph(self, character):
-        if not character in self.textures:
-            glyph = Glyph(character)
-            self.add_texture(character, glyph)
-
-    def add_texture(self, texture_id, texture_image):
-        if not texture_id in self.textures:
-            self.textures[texture_id] = index = self.next_index
-            self.next_index += 1
+        if self.layers.lookup(character) is None:
+            self.add_texture(character, load_glyph(character))
 
+    def add_texture(self, texture_id, texture_image, replace=False):
+        # With `replace`, a texture that's already present gets the new image.
+        if replace or texture_id not in self.layers:
             assert texture_image.width == self.width, f"Can't add: {texture_id!r}. Wrong texture width expected {self.width} got {texture_image.width}"
             assert texture_image.height == self.height, f"Can't add: {texture_id!r}. Wrong texture height expected {self.height} got {texture_image.height}"
 
-            self.bind()
-            gl.glTexSubImage3D(
+            if texture_id in self.layers:
+                index = self.layers[texture_id]
+            else:
+                index = self.layers.allocate(texture_id)
+                if self.layers.capacity > self.allocated_layers:
+                    self.grow()
+
+            pixels = texture_image.get_data("RGBA", self.width * 4)
+            if self.compressed:
+                self.upload_compressed(index, pixels)
+            elif self.uploader:
+                self.pending.add(texture_id)
+                self.uploader.put(self, texture_id, index, pixels)
+            else:
+                self.upload_layer(texture_id, index, pixels)
+
+    def upload_layer(self, texture_id, layer, pixels):
+        # `pixels` is an offset into the bound pixel unpack buffer, if any.
+        self.bind()
+        gl.glTexSubImage3D(
+            gl.GL_TEXTURE_2D_ARRAY,
+            0,
+            0,
+            0,
+            layer,
+            self.width,
+            self.height,
+            1,
+            self.pixel_format,
+            gl.GL_UNSIGNED_BYTE,
+            pixels,
+        )
+        self.mipmaps_dirty = True
+        self.pending.discard(texture_id)
+
+    def upload_compressed(self, layer, pixels):
+        pixels = np.frombuffer(pixels, np.uint8).reshape(self.height, self.width, 4)
+        levels = compress_mipmaps(pixels)
+
+        self.bind()
+        for (level, (data, (width, height))) in enumerate(zip(levels, mip_sizes(self.width, self.height))):
+            gl.glCompressedTexSubImage3D(
                 gl.GL_TEXTURE_2D_ARRAY,
+                level,
                 0,
                 0,
-                0,
-                index,
-                self.width,
-                self.height,
+                layer,
+                width,
+                height,
                 1,
-                self.pixel_format,
-                gl.GL_UNSIGNED_BYTE,
-                texture_image.get_data("RGBA", self.width * 4),
+                self.internal_format,
+                len(data),
+                data,
             )
+
+    def update_mipmaps(self):
+        # Mipmaps are regenerated for the whole array at once, so this is
+        # done at most once a frame rather than for every texture added.
+        if self.mipmaps_dirty:
+            self.bind()
             gl.glGenerateMipmap(gl.GL_TEXTURE_2D_ARRAY)
+            self.mipmaps_dirty = False
 
     def bind(self):
         gl.glBindTexture(gl.GL_TEXTURE_2D_ARRAY, self._id)
@@ -137,6 +314,138 @@ class TextureCube:
         self.bind()
 
 
+class PixelBuffer:
+    # A pixel unpack buffer, and a fence for the texture uploads reading it.
+    def __init__(self):
+        self._id = gl.GLuint()
+        gl.glGenBuffers(1, ctypes.byref(self._id))
+        self.size = 0
+        self.fence = None
+
+    def ready(self):
+        if not self.fence:
+            return True
+
+        result = gl.glClientWaitSync(self.fence, 0, 0)
+        if result not in (gl.GL_ALREADY_SIGNALED, gl.GL_CONDITION_SATISFIED):
+            return False
+
+        gl.glDeleteSync(self.fence)
+        self.fence = None
+        return True
+
+    def bind(self, nbytes):
+        gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, self._id)
+        if nbytes > self.size:
+            gl.glBufferData(gl.GL_PIXEL_UNPACK_BUFFER, nbytes, None, gl.GL_STREAM_DRAW)
+            self.size = nbytes
+
+    def write(self, offset, data):
+        gl.glBufferSubData(gl.GL_PIXEL_UNPACK_BUFFER, offset, memoryview(data).nbytes, data)
+
+    def unbind(self):
+        self.fence = gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, 0)
+
+
+class TextureUploader:
+    # Sends texture layers to the GPU through a ring of pixel buffers. Pixels
+    # are copied into the next buffer of the ring, once a frame, and the
+    # layers are updated from it, so glTexSubImage3D doesn't wait on client
+    # memory. A buffer is only reused once its fence shows the GPU has
+    # finished reading it; until then uploads wait in the queue, as do any
+    # over the frame's byte budget.
+    def __init__(self, buffers=3, budget=TEXTURE_UPLOAD_BUDGET):
+        self.budget = budget
+        self.buffers = [PixelBuffer() for _ in range(buffers)]
+        self.next_buffer = 0
+        self.queue = UploadQueue()
+
+        self.uploaded_bytes = 0
+        self.stalls = 0
+
+    def put(self, texture_cube, texture_id, layer, pixels):
+        self.queue.put((texture_cube, texture_id, layer, pixels), memoryview(pixels).nbytes)
+
+    def flush(self):
+        if not self.queue:
+            return 0
+
+        buffer = self.buffers[self.next_buffer]
+        if not buffer.ready():
+            self.stalls += 1
+            return 0
+        self.next_buffer = (self.next_buffer + 1) % len(self.buffers)
+
+        nbytes = self.queue.pending_bytes
+        uploads = self.queue.take(self.budget)
+        nbytes -= self.queue.pending_bytes
+
+        buffer.bind(max(nbytes, self.budget))
+        for (offset, (_, _, _, pixels)) in uploads:
+            buffer.write(offset, pixels)
+        for (offset, (texture_cube, texture_id, layer, _)) in uploads:
+            texture_cube.upload_layer(texture_id, layer, offset)
+        buffer.unbind()
+
+        self.uploaded_bytes += nbytes
+        return nbytes
+
+    def stats(self):
+        return {
+            "pending": len(self.queue),
+            "pending_bytes": self.queue.pending_bytes,
+            "uploaded_bytes": self.uploaded_bytes,
+            "stalls": self.stalls,
+        }
+
+
+def decode_image(data, width, height):
+    image = pyglet.image.load("image", file=io.BytesIO(data)).get_image_data()
+    pixels = np.frombuffer(image.get_data("RGBA", image.width * 4), np.uint8).reshape(image.height, image.width, 4)
+    return RgbaImage(width, height, fit_image(pixels, width, height).tobytes())
+
+
+class ImageDecoder:
+    # Decodes JPEG and PNG images to width x height RGBA on worker threads.
+    # The render thread collects finished images with `ready`, leaving it
+    # only the upload.
+    #
+    # Each image's data is tagged, by a hash say, and the tag comes back with
+    # the image. Data with a new tag replaces a pending decode of the old, and
+    # is decoded even if the old failed.
+    def __init__(self, width, height, workers=2):
+        self.width = width
+        self.height = height
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.pending = {}
+        self.failed = {}
+
+    def submit(self, key, data, tag=None):
+        if key in self.pending and self.pending[key][0] == tag:
+            return
+        if key in self.failed and self.failed[key] == tag:
+            return
+
+        self.failed.pop(key, None)
+        if key in self.pending:
+            self.pending[key][1].cancel()
+        self.pending[key] = (tag, self.executor.submit(decode_image, data, self.width, self.height))
+
+    def ready(self):
+        # Yields (key, image, tag) for each finished decode.
+        done = [key for (key, (_, future)) in self.pending.items() if future.done()]
+        for key in done:
+            (tag, future) = self.pending.pop(key)
+            try:
+                image = future.result()
+            except Exception as error:
+                print(f"Can't decode image {key!r}: {error}")
+                self.failed[key] = tag
+                continue
+            yield (key, image, tag)
+
+
 class Glyph:
     def __init__(self, character):
         if len(character) != 1:
@@ -157,11 +466,31 @@ class Glyph:
 
         self.width = bitmap.width
         self.height = bitmap.rows
-        array = bitmap.to_array()
-        array2 = copy(array)
-        array2[::4] = array[2::4]
-        array2[2::4] = array[::4]
-        self.image_data = bytes(array2)
+        # FreeType renders colour glyphs as BGRA.
+        self.image_data = swap_red_blue(bitmap.to_array()).tobytes()
 
     def get_data(self, _format, _size):
         return self.image_data
+
+
+def load_glyph(character):
+    # Rasterising is slow, so every glyph rendered is kept in GLYPH_CACHE,
+    # as are the characters the font can't render.
+    glyph = GLYPH_CACHE.load(character)
+    if glyph is None:
+        try:
+            glyph = Glyph(character)
+        except ValueError:
+            GLYPH_CACHE.store_missing(character)
+            raise
+        GLYPH_CACHE.store(character, glyph.width, glyph.height, glyph.image_data)
+    return glyph
+
+
+def prewarm_glyphs(characters=COMMON_GLYPHS):
+    for character in characters:
+        if character not in GLYPH_CACHE:
+            try:
+                load_glyph(character)
+            except ValueError:
+                pass
@@ -0,0 +1,190 @@
+import argparse
+from collections import OrderedDict
+import hashlib
+import json
+import mmap
+import os
+import time
+
+THUMBNAIL_PACK = os.path.join("photos", "thumbnails.pack")
+THUMBNAIL_BUDGET = 64 * 1024 * 1024
+
+# Seconds the index may go unsaved after it changes, for flush_index.
+INDEX_SAVE_INTERVAL = 5.0
+
+
+def photo_hash(image_data):
+    return hashlib.sha1(image_data).hexdigest()
+
+
+class ThumbnailStore:
+    # Decoded avatar photos, `width` x `height` RGBA, kept in slots of one
+    # memory mapped pack file so they can be uploaded without decoding. The
+    # index beside it maps avatar ids to the hash of the photo each thumbnail
+    # was made from and its slot, least recently used first.
+    #
+    # The pack holds at most `max_bytes` of thumbnails. Past that the least
+    # recently used are evicted and their slots reused. `compact` moves the
+    # thumbnails to the front of the pack and truncates it.
+    #
+    # Changes to the index are saved by `flush_index`, so many thumbnails can
+    # be put for one write. Until then evicted thumbnails' slots aren't
+    # reused, as the saved index still names them.
+    def __init__(self, path=THUMBNAIL_PACK, width=150, height=150, max_bytes=THUMBNAIL_BUDGET):
+        self.path = path
+        self.index_path = f"{path}.index"
+        self.size = (width, height)
+        self.blob_bytes = width * height * 4
+        self.max_slots = max(max_bytes // self.blob_bytes, 1)
+
+        self.index = OrderedDict()
+        self.load_index()
+
+        mode = "r+b" if os.path.exists(path) else "w+b"
+        self.file = open(path, mode)
+        self.slots = os.path.getsize(path) // self.blob_bytes
+        self.index = OrderedDict((key, value) for (key, value) in self.index.items() if value[1] < self.slots)
+        while len(self.index) > self.max_slots:
+            self.index.popitem(last=False)
+        # Every slot no thumbnail is in, including those just dropped, is free.
+        used = {slot for (_, slot) in self.index.values()}
+        self.free = sorted(set(range(self.slots)) - used, reverse=True)
+        self.released = []
+        self.changed = None
+        self.mapping = None
+
+    def load_index(self):
+        try:
+            with open(self.index_path) as fh:
+                index = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return
+
+        if tuple(index["size"]) == self.size:
+            for (avatar_id, source, slot) in index["thumbnails"]:
+                self.index[avatar_id] = (source, slot)
+
+    def save_index(self):
+        index = {
+            "size": self.size,
+            "thumbnails": [[avatar_id, source, slot] for (avatar_id, (source, slot)) in self.index.items()],
+        }
+        temporary = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as fh:
+            json.dump(index, fh)
+        os.replace(temporary, self.index_path)
+
+        self.free.extend(self.released)
+        self.free.sort(reverse=True)
+        self.released = []
+        self.changed = None
+
+    def flush_index(self, max_age=0):
+        # Saves the index if it has changes at least `max_age` seconds old.
+        if self.changed is not None and time.monotonic() - self.changed >= max_age:
+            self.save_index()
+
+    def __contains__(self, avatar_id):
+        return avatar_id in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def avatar_ids(self):
+        # Most recently used first.
+        return list(reversed(self.index))
+
+    def source(self, avatar_id):
+        return self.index.get(avatar_id, (None, None))[0]
+
+    def get(self, avatar_id, source=None):
+        # The avatar's thumbnail as bytes, or None if there isn't one made
+        # from the photo with hash `source`, when that's given.
+        if avatar_id not in self.index:
+            return None
+        (stored_source, slot) = self.index[avatar_id]
+        if source is not None and source != stored_source:
+            return None
+
+        self.index.move_to_end(avatar_id)
+        self.mark_changed()
+        start = slot * self.blob_bytes
+        return bytes(self.map(start + self.blob_bytes)[start : start + self.blob_bytes])
+
+    def put(self, avatar_id, source, data):
+        assert len(data) == self.blob_bytes, f"Thumbnails are {self.blob_bytes} bytes, got {len(data)}"
+
+        if avatar_id in self.index:
+            slot = self.index.pop(avatar_id)[1]
+        else:
+            if len(self.index) >= self.max_slots:
+                self.released.append(self.index.popitem(last=False)[1][1])
+            if self.free:
+                slot = self.free.pop()
+            else:
+                slot = self.slots
+                self.slots += 1
+
+        self.file.seek(slot * self.blob_bytes)
+        self.file.write(data)
+        self.file.flush()
+
+        self.index[avatar_id] = (source, slot)
+        self.mark_changed()
+
+    def mark_changed(self):
+        # Including the recently used order, which decides what's evicted.
+        if self.changed is None:
+            self.changed = time.monotonic()
+
+    def map(self, end):
+        # Written slots past the end of the mapping need a new one.
+        if self.mapping is None or len(self.mapping) < end:
+            self.close_mapping()
+            self.mapping = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.mapping
+
+    def close_mapping(self):
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+
+    def compact(self):
+        # Returns the number of bytes freed.
+        self.close_mapping()
+        before = self.slots * self.blob_bytes
+
+        moves = sorted((slot, avatar_id) for (avatar_id, (_, slot)) in self.index.items())
+        for (new_slot, (slot, avatar_id)) in enumerate(moves):
+            if new_slot != slot:
+                self.file.seek(slot * self.blob_bytes)
+                data = self.file.read(self.blob_bytes)
+                self.file.seek(new_slot * self.blob_bytes)
+                self.file.write(data)
+                self.index[avatar_id] = (self.index[avatar_id][0], new_slot)
+
+        self.slots = len(moves)
+        self.free = []
+        self.released = []
+        self.file.truncate(self.slots * self.blob_bytes)
+        self.file.flush()
+        self.save_index()
+        return before - self.slots * self.blob_bytes
+
+    def close(self):
+        self.flush_index()
+        self.close_mapping()
+        self.file.close()
+
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser("Avatar thumbnail store")
+    argument_parser.add_argument("--compact", action="store_true")
+    argument_parser.add_argument("--path", default=THUMBNAIL_PACK)
+    args = argument_parser.parse_args()
+
+    store = ThumbnailStore(args.path)
+    print(f"{len(store)} thumbnails in {store.slots} slots.")
+    if args.compact:
+        print(f"Compacted, freeing {store.compact() / 1024:.0f} KB.")
+    store.close()
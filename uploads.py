@@ -0,0 +1,107 @@
+from collections import deque
+
+import numpy as np
+
+# Dirty ranges closer than this are uploaded as one, gap included.
+MERGE_GAP_BYTES = 4096
+
+
+def merge_ranges(ranges, gap=0):
+    merged = []
+    for (start, end) in sorted(ranges):
+        if merged and start <= merged[-1][1] + gap:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [tuple(r) for r in merged]
+
+
+class StagingBuffer:
+    # CPU side copy of a GPU buffer of `dtype` records. Writes land here and
+    # are recorded as dirty ranges, which are merged and handed out for upload
+    # in large pieces, at most `budget` bytes at a time.
+    def __init__(self, dtype, capacity):
+        self.data = np.zeros(capacity, dtype)
+        self.dirty = []
+        self.merge_gap = MERGE_GAP_BYTES // dtype.itemsize
+
+    @property
+    def itemsize(self):
+        return self.data.dtype.itemsize
+
+    def write(self, offset, data):
+        self.data[offset : offset + len(data)] = data
+        self.dirty.append((offset, offset + len(data)))
+
+    def scatter(self, offsets, data):
+        # Write single records at many offsets.
+        self.data[offsets] = data
+        self.dirty.extend((offset, offset + 1) for offset in offsets)
+
+    def move(self, old_offset, new_offset, size):
+        self.write(new_offset, self.data[old_offset : old_offset + size])
+
+    def resize(self, capacity):
+        data = np.zeros(capacity, self.data.dtype)
+        data[: len(self.data)] = self.data
+        self.data = data
+
+    def mark_clean(self):
+        # Forget the dirty ranges, for callers that upload everything. Returns
+        # whether there was anything to upload.
+        dirty = bool(self.dirty)
+        self.dirty = []
+        return dirty
+
+    @property
+    def pending_bytes(self):
+        return sum(end - start for (start, end) in merge_ranges(self.dirty)) * self.itemsize
+
+    def take(self, budget=None):
+        # Returns [(offset, records)] to upload, leaving whatever doesn't fit
+        # in the budget dirty for next time.
+        ranges = merge_ranges(self.dirty, self.merge_gap)
+        self.dirty = []
+
+        remaining = None if budget is None else budget // self.itemsize
+        uploads = []
+        for (start, end) in ranges:
+            if remaining is not None and end - start > remaining:
+                if remaining > 0:
+                    uploads.append((start, self.data[start : start + remaining]))
+                self.dirty.append((start + max(remaining, 0), end))
+                remaining = 0
+            else:
+                uploads.append((start, self.data[start:end]))
+                if remaining is not None:
+                    remaining -= end - start
+        return uploads
+
+
+class UploadQueue:
+    # Uploads waiting for room in a frame's byte budget, sent in the order
+    # they were made and packed one after another into a staging buffer.
+    def __init__(self):
+        self.pending = deque()
+        self.pending_bytes = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def put(self, upload, nbytes):
+        self.pending.append((upload, nbytes))
+        self.pending_bytes += nbytes
+
+    def take(self, budget):
+        # Returns [(offset, upload)] for as many uploads as fit in `budget`
+        # bytes. The first one always goes, however big, so that nothing
+        # waits forever.
+        uploads = []
+        offset = 0
+        while self.pending and (not uploads or offset + self.pending[0][1] <= budget):
+            (upload, nbytes) = self.pending.popleft()
+            uploads.append((offset, upload))
+            offset += nbytes
+            self.pending_bytes -= nbytes
+        return uploads
@@ -1,10 +1,16 @@
-import queue
+import time
 import pyglet
 
 from vector import Vector
-from scene import Scene, tex_coords, Cube, Mesh
-from textures import TextureCube
+from scene import ChunkedScene, DetailLevels, InstancedScene
+from wall_mesher import WallMesher
+from mesh import DEFAULT_COLOR, DEFAULT_TEXTURE, tex_coords, color_to_rgb, cube_instances, Cube, Mesh, MeshTemplates
+from images import RgbaImage
+from ingest import EntityBacklog
+from textures import ImageDecoder, TextureCube, TextureUploader
+from layers import LayersFull
 from shader import Shader
+from thumbnails import INDEX_SAVE_INTERVAL, photo_hash
 
 COLORS = {
     "gray": "#919c9c",
@@ -20,6 +26,25 @@ WALL_COLORS = list(COLORS.keys())
 
 PHOTOS = {}
 
+UPLOAD_BUDGET = 4 * 1024 * 1024
+
+# Seconds a frame spends handling entity updates, in batches of this many
+# entities.
+INGEST_BUDGET = 0.005
+INGEST_BATCH = 256
+
+# Each of the glyph and avatar texture arrays grows up to this size.
+TEXTURE_BUDGET = 64 * 1024 * 1024
+
+# Shown on avatars until their photo has been decoded.
+PLACEHOLDER = "placeholder"
+
+ORIGIN = NO_OFFSET = Vector(0, 0, 0)
+
+# Meshes made of several cubes, built once and copied into place. A single
+# cube is one record, so building it is as cheap as copying a template.
+TEMPLATES = MeshTemplates()
+
 
 def floor(textures):
     texture_index = textures.index("grid")
@@ -35,52 +60,94 @@ def floor(textures):
     )
 
 
+def cube_shape(entity_type, entity):
+    # (size, colour, offset) for entities drawn as a single cube, or None.
+    if entity_type == "Wall":
+        return (Vector(1, 1, 1), COLORS[entity["color"]], NO_OFFSET)
+    if entity_type == "Avatar":
+        return (Vector(0.05, 0.8, 0.4), "#000000", NO_OFFSET)
+    if entity_type == "ZoomLink":
+        return (Vector(0.6, 0.6, 0.6), "#0000ff", NO_OFFSET)
+    if entity_type == "Bot" and entity["emoji"] != "👾":
+        return (Vector(0.4, 0.4, 0.4), "#202020", NO_OFFSET)
+    if entity_type == "Link":
+        return (Vector(0.8, 0.8, 0.8), None, NO_OFFSET)
+    if entity_type == "Note":
+        return (Vector(1, 1, 1), COLORS["yellow"], NO_OFFSET)
+    if entity_type in ("AudioBlock", "RC::Calendar"):
+        return (Vector(0.6, 0.6, 0.6), None, NO_OFFSET)
+    if entity_type == "AudioRoom":
+        return (
+            Vector(entity["width"], 0.002, entity["height"]),
+            None,
+            Vector(entity["width"] / 2 - 0.5, 0, entity["height"] / 2 - 0.5),
+        )
+    return None
+
+
+def desk():
+    leg_color = "#333333"
+    mesh = Mesh()
+    mesh += Cube(ORIGIN, Vector(0.9, 0.04, 0.9), color=COLORS["orange"], offset=Vector(0, 0.35, 0))
+    mesh += Cube(ORIGIN, Vector(0.04, 0.35, 0.04), color=leg_color, offset=Vector(-0.4, 0, -0.4))
+    mesh += Cube(ORIGIN, Vector(0.04, 0.35, 0.04), color=leg_color, offset=Vector(-0.4, 0, 0.4))
+    mesh += Cube(ORIGIN, Vector(0.04, 0.35, 0.04), color=leg_color, offset=Vector(0.4, 0, -0.4))
+    mesh += Cube(ORIGIN, Vector(0.04, 0.35, 0.04), color=leg_color, offset=Vector(0.4, 0, 0.4))
+    return mesh
+
+
 def get_mesh(entity_type, entity, texture):
     position = Vector(entity["pos"]["x"], 0, entity["pos"]["y"])
 
-    if entity["type"] == "Wall":
-        return Cube(position, color=COLORS[entity["color"]], texture=texture)
-    if entity["type"] == "Desk":
-        leg_color = "#333333"
-        mesh = Mesh()
-        mesh += Cube(position, Vector(0.9, 0.04, 0.9), color=COLORS["orange"], offset=Vector(0, 0.35, 0))
-        mesh += Cube(position, Vector(0.04, 0.35, 0.04), color=leg_color, offset=Vector(-0.4, 0, -0.4))
-        mesh += Cube(position, Vector(0.04, 0.35, 0.04), color=leg_color, offset=Vector(-0.4, 0, 0.4))
-        mesh += Cube(position, Vector(0.04, 0.35, 0.04), color=leg_color, offset=Vector(0.4, 0, -0.4))
-        mesh += Cube(position, Vector(0.04, 0.35, 0.04), color=leg_color, offset=Vector(0.4, 0, 0.4))
-        return mesh
-    if entity["type"] == "Avatar":
-        return Cube(position, Vector(0.05, 0.8, 0.4), color="#000000", texture=texture)
-    if entity["type"] == "ZoomLink":
-        return Cube(position, Vector(0.6, 0.6, 0.6), color="#0000ff", texture=texture)
-    if entity["type"] == "Bot" and entity["emoji"] != "👾":
-        return Cube(position, Vector(0.4, 0.4, 0.4), color="#202020", texture=texture)
-    if entity["type"] == "Link":
-        return Cube(position, Vector(0.8, 0.8, 0.8), texture=texture)
-    if entity["type"] == "Note":
-        return Cube(position, color=COLORS["yellow"], texture=texture)
-    if entity["type"] == "AudioBlock":
-        return Cube(position, Vector(0.6, 0.6, 0.6), texture=texture)
-    if entity["type"] == "RC::Calendar":
-        return Cube(position, Vector(0.6, 0.6, 0.6), texture=texture)
-    if entity["type"] == "AudioRoom":
-        return Cube(
-            position,
-            Vector(entity["width"], 0.002, entity["height"]),
-            texture=texture,
-            offset=Vector(entity["width"] / 2 - 0.5, 0, entity["height"] / 2 - 0.5),
+    if entity_type == "Desk":
+        return TEMPLATES.instantiate((entity_type,), position, desk)
+
+    shape = cube_shape(entity_type, entity)
+    if shape is None:
+        return None
+    (size, color, offset) = shape
+    return Cube(position, size, color=color, texture=texture, offset=offset)
+
+
+def get_cubes(entities, textures):
+    # The vectorized get_mesh for entities with a cube_shape: one instance
+    # for each entity.
+    shapes = [cube_shape(entity["type"], entity) for entity in entities]
+    return cube_instances(
+        [(entity["pos"]["x"], 0, entity["pos"]["y"]) for entity in entities],
+        [tuple(size) for (size, _, _) in shapes],
+        [color_to_rgb(color or DEFAULT_COLOR) for (_, color, _) in shapes],
+        [texture or DEFAULT_TEXTURE for texture in textures],
+        [tuple(offset) for (_, _, offset) in shapes],
+    )
+
+
+def get_far_mesh(entity_type, entity):
+    # A simpler mesh to draw from far away, or None to keep the full mesh.
+    position = Vector(entity["pos"]["x"], 0, entity["pos"]["y"])
+
+    if entity_type == "Desk":
+        return TEMPLATES.instantiate(
+            ("far", entity_type), position, lambda: Cube(ORIGIN, Vector(0.9, 0.39, 0.9), color=COLORS["orange"])
         )
     return None
 
 
 class VirtualRc:
-    def __init__(self, camera, entity_queue):
-        self.entity_queue = entity_queue
+    def __init__(self, camera, thumbnails):
+        self.backlog = EntityBacklog()
 
-        self.shader = Shader("world")
+        self.shader = Shader(vert_path="world_instanced.vert.glsl", frag_path="world.frag.glsl")
+        self.wall_shader = Shader(vert_path="world.vert.glsl", frag_path="world.frag.glsl")
         self.shader.use()
 
-        self.building_textures = TextureCube(128, 128, 8)
+        # S3TC is an extension, if a near universal one. Without it the
+        # building textures are uploaded uncompressed.
+        if pyglet.gl.gl_info.have_extension("GL_EXT_texture_compression_s3tc"):
+            building_format = pyglet.gl.GL_COMPRESSED_RGBA_S3TC_DXT5_EXT
+        else:
+            building_format = pyglet.gl.GL_RGBA8
+        self.building_textures = TextureCube(128, 128, 8, internal_format=building_format)
         for name in [
             "empty",
             "audio_block",
@@ -93,70 +160,202 @@ class VirtualRc:
         ]:
             self.building_textures.add_texture_png(name)
 
-
-        self.glyph_textures = TextureCube(136, 128, 500)
-        self.glyphable = Scene()
-
-        self.building = Scene()
-        self.building.add_entity("floor", floor(self.building_textures))
-
-        self.avatar_textures = TextureCube(150, 150, 50)
+        self.texture_uploader = TextureUploader()
+        self.glyph_textures = TextureCube(136, 128, 64, memory_budget=TEXTURE_BUDGET, uploader=self.texture_uploader)
+        self.waiting_glyphs = {}
+        self.glyphable = ChunkedScene()
+        self.wall_mesher = WallMesher()
+        self.walls = ChunkedScene(instanced=False)
+
+        self.building = ChunkedScene(usage=pyglet.gl.GL_STATIC_DRAW)
+
+        # The floor spans the world, so in a chunk its box would cover every
+        # other and never be culled. It never changes or casts a shadow, so
+        # it's drawn on its own, outside the chunks.
+        self.floor = InstancedScene(1, pyglet.gl.GL_STATIC_DRAW)
+        self.floor.add_entity("floor", floor(self.building_textures))
+        self.floor.flush()
+
+        # Photos are opaque, so avatars need no alpha channel.
+        self.avatar_textures = TextureCube(
+            150,
+            150,
+            64,
+            memory_budget=TEXTURE_BUDGET,
+            uploader=self.texture_uploader,
+            internal_format=pyglet.gl.GL_RGB8,
+        )
         self.avatar_textures.clamp_border(Vector(0.8, 0.8, 0.8))
-
-        self.avatars = Scene(max_vertices=10_000)
+        self.avatar_textures.add_texture(PLACEHOLDER, RgbaImage.filled(150, 150, (204, 204, 204, 255)))
+        self.avatar_textures.index(PLACEHOLDER, PLACEHOLDER)
+        self.photo_decoder = ImageDecoder(150, 150)
+        self.waiting_avatars = {}
+
+        # Start uploading the most recently seen avatars' photos at once,
+        # least recent first to keep the store's order. Only as many as fit
+        # the array's first allocation, beside the placeholder, so the rest of
+        # the uploads don't wait behind them.
+        self.thumbnails = thumbnails
+        self.photo_sources = {}
+        for avatar_id in reversed(self.thumbnails.avatar_ids()[: self.avatar_textures.layers.capacity - 1]):
+            self.load_photo(avatar_id)
+
+        # Avatars move all the time, so their buffer is streamed.
+        self.avatars = ChunkedScene(capacity=16, usage=pyglet.gl.GL_STREAM_DRAW)
         self.camera = camera
+        self.detail = DetailLevels()
 
     def scenes(self):
-        return [self.glyphable, self.building, self.avatars]
+        return [self.walls, self.glyphable, self.building, self.avatars]
 
     def draw(self, sun_position, shadow_map):
-        self.shader.use()
-        self.shader["sun_position"] = sun_position
-        self.shader["matrix"] = self.camera.mvp_matrix
-        self.shader["camera"] = self.camera.position
-        self.shader["light_space_matrix"] = shadow_map.light_space_matrix
+        for shader in (self.wall_shader, self.shader):
+            shader.use()
+            shader["sun_position"] = sun_position
+            shader["matrix"] = self.camera.mvp_matrix
+            shader["camera"] = self.camera.position
+            shader["light_space_matrix"] = shadow_map.light_space_matrix
+            shader["pcf_distance"] = float(self.detail.pcf_distance)
+            shader["texture_array_sampler"] = 0
+            shader["shadow_map"] = 1
+        shadow_map.activate(1)
 
+        self.wall_shader.use()
         self.glyph_textures.activate(0)
-        shadow_map.activate(1)
-        self.shader["texture_array_sampler"] = 0
-        self.shader["shadow_map"] = 1
-        self.glyphable.draw()
+        self.draw_scene(self.walls)
+
+        self.shader.use()
+        self.draw_scene(self.glyphable)
 
         self.building_textures.activate(0)
-        shadow_map.activate(1)
-        self.shader["texture_array_sampler"] = 0
-        self.shader["shadow_map"] = 1
-        self.building.draw()
+        self.floor.draw()
+        self.draw_scene(self.building)
 
         self.avatar_textures.activate(0)
-        shadow_map.activate(1)
-        self.shader["texture_array_sampler"] = 0
-        self.shader["shadow_map"] = 1
-        self.avatars.draw()
-
-    def update(self):
+        self.draw_scene(self.avatars)
+
+    def draw_scene(self, scene):
+        scene.draw(self.camera.mvp_matrix, self.camera.position, self.detail.far_distance)
+
+    def receive(self, entities):
+        self.backlog.extend(entities)
+
+    def update(self, budget=INGEST_BUDGET):
+        # Received entities are only handled for as long as the budget
+        # allows, a batch at a time. The rest waits in the backlog, where
+        # later updates replace it.
+        deadline = time.perf_counter() + budget
+        while self.backlog and time.perf_counter() < deadline:
+            self.handle_entities(self.backlog.take(INGEST_BATCH))
+        self.add_photos()
+        self.thumbnails.flush_index(INDEX_SAVE_INTERVAL)
+        self.add_glyphs()
+        self.update_walls()
+        for scene in self.scenes():
+            scene.compact()
+
+    def add_photo(self, avatar_id, image_data):
+        # Photos that have changed since their thumbnail was made are decoded
+        # again, even if the old one is showing.
+        PHOTOS[avatar_id] = image_data
+        source = photo_hash(image_data)
+        self.photo_sources[avatar_id] = source
+        if self.thumbnails.source(avatar_id) != source:
+            self.photo_decoder.submit(avatar_id, image_data, source)
+        elif avatar_id in self.waiting_avatars:
+            self.load_photo(avatar_id)
+
+    def load_photo(self, avatar_id):
+        # From the thumbnail store if it has the avatar, else by decoding.
+        thumbnail = self.thumbnails.get(avatar_id)
+        if thumbnail is None:
+            if avatar_id in PHOTOS:
+                self.photo_decoder.submit(avatar_id, PHOTOS[avatar_id], self.photo_sources.get(avatar_id))
+            return
+
+        self.add_avatar_texture(avatar_id, RgbaImage(150, 150, thumbnail))
+
+    def add_avatar_texture(self, avatar_id, image):
         try:
-            while True:
-                self.handle_entity(self.entity_queue.get_nowait())
-        except queue.Empty:
-            pass
+            self.avatar_textures.add_texture(avatar_id, image, replace=True)
+        except LayersFull:
+            return
+        # An avatar showing the placeholder holds its photo's layer while the
+        # photo uploads, so the layer isn't evicted before it can be shown.
+        if avatar_id in self.waiting_avatars:
+            self.avatar_textures.index(avatar_id, avatar_id)
+
+    def add_photos(self):
+        # Queue the photos decoded since last frame for upload, and redraw the
+        # avatars whose photos have arrived on the GPU.
+        for (entity_id, image, source) in self.photo_decoder.ready():
+            self.thumbnails.put(entity_id, source, image.data)
+            self.add_avatar_texture(entity_id, image)
+
+        for entity_id in [key for key in self.waiting_avatars if self.avatar_textures.ready(key)]:
+            self.add_entity(self.waiting_avatars.pop(entity_id))
+
+    def add_glyphs(self):
+        # Redraw the walls and bots whose glyphs have arrived on the GPU.
+        ready = [key for (key, (character, _)) in self.waiting_glyphs.items() if self.glyph_textures.ready(character)]
+        for entity_id in ready:
+            self.add_entity(self.waiting_glyphs.pop(entity_id)[1])
+
+    def update_walls(self):
+        # Remesh the blocks of walls that changed, once for all of this
+        # frame's updates.
+        for (block, mesh) in self.wall_mesher.take_dirty().items():
+            if mesh is None:
+                self.walls.delete_entity(block)
+            else:
+                self.walls.add_entity(block, mesh)
+
+    def texture_cubes(self):
+        return [self.building_textures, self.glyph_textures, self.avatar_textures]
+
+    def texture_memory(self):
+        return {
+            "building": self.building_textures.stats(),
+            "glyphs": self.glyph_textures.stats(),
+            "avatars": self.avatar_textures.stats(),
+        }
+
+    def upload(self, budget=UPLOAD_BUDGET):
+        # Send this frame's staged scene changes to the GPU. Anything over the
+        # budget waits for the next frame.
+        for scene in self.scenes():
+            budget -= scene.flush(budget)
+
+        self.texture_uploader.flush()
+        for texture_cube in self.texture_cubes():
+            texture_cube.update_mipmaps()
+
+    def scene(self, entity_type):
+        if entity_type == "Avatar":
+            return self.avatars
+        if entity_type == "Bot":
+            return self.glyphable
+        return self.building
 
     def add_entity(self, entity):
         entity_id = entity["id"]
         entity_type = entity["type"]
-
-        if entity_type == "Avatar":
-            scene = self.avatars
-        elif entity_type in ("Wall", "Bot"):
-            scene = self.glyphable
-        else:
-            scene = self.building
+        scene = self.scene(entity_type)
 
         texture = self.get_texture(entity_type, entity)
+        if entity_type == "Wall":
+            position = entity["pos"]
+            color = COLORS[entity["color"]]
+            replaced = self.wall_mesher.add_wall(entity_id, position["x"], position["y"], color, texture)
+            if replaced is not None:
+                self.glyph_textures.release(replaced)
+                self.waiting_glyphs.pop(replaced, None)
+            return
+
         mesh = get_mesh(entity_type, entity, texture)
 
         if mesh:
-            scene.add_entity(entity_id, mesh)
+            scene.add_entity(entity_id, mesh, get_far_mesh(entity_type, entity))
 
     def get_texture(self, entity_type, entity):
         x0, x1 = (0.0, 1.0)
@@ -167,27 +366,23 @@ class VirtualRc:
             x0, x1 = (-0.0, 1.0)
             y0, y1 = (-1.0, 1.0)
 
-            try:
-                self.avatar_textures.add_texture_png(entity_id, PHOTOS[entity_id])
-                texture_index = self.avatar_textures.index(entity_id)
-            except pyglet.gl.lib.GLException:
-                return None
+            if self.avatar_textures.lookup(entity_id) is not None:
+                texture_index = self.avatar_textures.index(entity_id, entity_id)
+            else:
+                self.waiting_avatars[entity_id] = entity
+                if entity_id in self.avatar_textures.pending:
+                    self.avatar_textures.index(entity_id, entity_id)
+                else:
+                    self.load_photo(entity_id)
+                texture_index = self.avatar_textures.index(PLACEHOLDER)
         elif entity_type == "Wall" and entity.get("wall_text"):
-            try:
-                self.glyph_textures.add_texture_glyph(entity["wall_text"])
-                texture_index = self.glyph_textures.index(entity["wall_text"])
-                x0, x1 = (0.0, 1.0)
-                y0, y1 = (1.0, 0.0)
-            except ValueError:
-                return None
+            return self.get_glyph(entity["wall_text"], entity)
+        elif entity_type == "Wall":
+            self.glyph_textures.release(entity["id"])
+            self.waiting_glyphs.pop(entity["id"], None)
+            return None
         elif entity_type == "Bot":
-            try:
-                self.glyph_textures.add_texture_glyph(entity["emoji"])
-                texture_index = self.glyph_textures.index(entity["emoji"])
-                x0, x1 = (0.0, 1.0)
-                y0, y1 = (1.0, 0.0)
-            except ValueError:
-                return None
+            return self.get_glyph(entity["emoji"], entity)
         elif entity_type == "ZoomLink":
             texture_index = self.building_textures.index("zoom")
         elif entity_type == "Link":
@@ -206,13 +401,59 @@ class VirtualRc:
 
         return tex_coords(x0, x1, y0, y1, texture_index)
 
+    def get_glyph(self, character, entity):
+        # The glyph's layer may have held another glyph until its upload
+        # lands, so until then the entity is untextured and waits to be
+        # redrawn, like avatars waiting for their photos.
+        entity_id = entity["id"]
+        try:
+            self.glyph_textures.add_texture_glyph(character)
+            texture_index = self.glyph_textures.index(character, entity_id)
+        except (LayersFull, ValueError):
+            self.waiting_glyphs.pop(entity_id, None)
+            return None
+
+        if not self.glyph_textures.ready(character):
+            self.waiting_glyphs[entity_id] = (character, entity)
+            return None
+        self.waiting_glyphs.pop(entity_id, None)
+        return tex_coords(0.0, 1.0, 1.0, 0.0, texture_index)
+
+    def add_cubes(self, entities):
+        # Add entities with a cube_shape with one vectorized build for each
+        # scene.
+        by_scene = {}
+        for entity in entities:
+            by_scene.setdefault(self.scene(entity["type"]), []).append(entity)
+
+        for (scene, scene_entities) in by_scene.items():
+            textures = [self.get_texture(entity["type"], entity) for entity in scene_entities]
+            scene.add_cubes([entity["id"] for entity in scene_entities], get_cubes(scene_entities, textures))
+
+    def handle_entities(self, entities):
+        # Runs of single cube entities, like the snapshot sent on connecting,
+        # are added together. Everything else is handled in order between them.
+        cubes = {}
+        for entity in entities:
+            if entity.get("deleted") or entity["type"] == "Wall" or not cube_shape(entity["type"], entity):
+                self.add_cubes(cubes.values())
+                cubes = {}
+                self.handle_entity(entity)
+            else:
+                cubes[entity["id"]] = entity
+        self.add_cubes(cubes.values())
+
     def handle_entity(self, entity):
-        if entity.get("deleted"):
-            if entity["type"] == "Avatar":
-                self.avatars.delete_entity(entity["id"])
-            elif entity["type"] in ("Wall", "Bot"):
-                self.glyphable.delete_entity(entity["id"])
+        if entity["type"] == "Photo":
+            self.add_photo(entity["id"], entity["image_data"])
+        elif entity.get("deleted"):
+            self.glyph_textures.release(entity["id"])
+            self.avatar_textures.release(entity["id"])
+            self.waiting_avatars.pop(entity["id"], None)
+            self.waiting_glyphs.pop(entity["id"], None)
+            if entity["type"] == "Wall":
+                self.wall_mesher.delete_wall(entity["id"])
             else:
-                self.building.delete_entity(entity["id"])
+                self.scene(entity["type"]).delete_entity(entity["id"])
         else:
             self.add_entity(entity)
@@ -1,9 +1,7 @@
 import threading
 import asyncio
 import time
-from queue import Queue
 import traceback
-from concurrent.futures import ThreadPoolExecutor
 import datetime
 import argparse
 
@@ -16,16 +14,34 @@ from pyglet import gl, window
 import pyglet
 
 from camera import Camera
+from channel import Channel, DeduplicatingChannel
 from vector import Vector
 import photos
 from sky import Sky, astronomy
+from publisher import MAX_POSITION_RATE, AvatarPublisher
 from shadows import ShadowMap
-from virtualrc import WALL_COLORS, VirtualRc, PHOTOS
+from textures import prewarm_glyphs
+from thumbnails import ThumbnailStore
+from virtualrc import WALL_COLORS, VirtualRc
+
+# Seconds a wall waits for the avatar's bot to be created before it's dropped.
+BOT_READY_TIMEOUT = 10.0
 
 
 class World:
-    def __init__(self, entity_queue, avatar_update_queue, offset=0, speed=None, show_grid=False, show_atmosphere=True):
-        self.avatar_update_queue = avatar_update_queue
+    def __init__(
+        self,
+        entity_channel,
+        avatar_channel,
+        publisher,
+        offset=0,
+        speed=None,
+        show_grid=False,
+        show_atmosphere=True,
+    ):
+        self.entity_channel = entity_channel
+        self.avatar_channel = avatar_channel
+        self.publisher = publisher
 
         self.window = pyglet.window.Window(caption="VRC3D", resizable=True, fullscreen=False)
         pyglet.gl.Config(major_version=3, minor_version=3)
@@ -56,7 +72,13 @@ class World:
         # self.active_color = 0
 
         self.shadow_map = ShadowMap()
-        self.virtual_rc = VirtualRc(self.camera, entity_queue)
+        self.virtual_rc = VirtualRc(self.camera, ThumbnailStore())
+
+        # Entities are handed over when the network thread says they've
+        # arrived, on the main thread, rather than polled for every frame.
+        self.window.register_event_type("on_entities")
+        self.window.event(self.on_entities)
+        entity_channel.listen(lambda: pyglet.app.platform_event_loop.post_event(self.window, "on_entities"))
         self.sky = Sky(show_grid, show_atmosphere)
 
         self.offset = offset
@@ -65,6 +87,9 @@ class World:
 
         self.astro = None
 
+    def on_entities(self):
+        self.virtual_rc.receive(self.entity_channel.take())
+
     def on_resize(self, width, height):
         self.camera.resize(width, height)
 
@@ -78,7 +103,7 @@ class World:
         elif KEY == window.key.ENTER:
             self.window.set_fullscreen(not self.window.fullscreen)
         elif KEY == window.key.X:
-            self.avatar_update_queue.put(
+            self.avatar_channel.put(
                 {
                     "type": "wall",
                     "payload": {
@@ -89,7 +114,7 @@ class World:
             )
         elif KEY == window.key.LCTRL:
             print("Bang!")
-            self.avatar_update_queue.put(
+            self.avatar_channel.put(
                 {
                     "type": "rocket",
                     "payload": self.avatar_position(),
@@ -97,7 +122,7 @@ class World:
             )
         elif KEY == window.key.C:
             self.active_color += 1
-            self.avatar_update_queue.put(
+            self.avatar_channel.put(
                 {
                     "type": "wall",
                     "payload": {
@@ -108,6 +133,19 @@ class World:
             )
         elif KEY == window.key.P:
             print(pyglet.clock.get_fps())
+            print(self.publisher.stats())
+            print(self.virtual_rc.backlog.stats())
+            print(f"Entities: {self.entity_channel.stats()}, avatar updates: {self.avatar_channel.stats()}")
+        elif KEY == window.key.M:
+            for (name, stats) in self.virtual_rc.texture_memory().items():
+                print(f"{name}: {stats['bytes'] / 1024:.0f} KB in {stats['capacity']} layers, {stats['layers']} used")
+        elif KEY in (window.key.BRACKETLEFT, window.key.BRACKETRIGHT):
+            detail = self.virtual_rc.detail
+            detail.scale(0.8 if KEY == window.key.BRACKETLEFT else 1.25)
+            print(
+                f"Far detail: {detail.far_distance:.0f}, shadows: {detail.shadow_distance:.0f}, "
+                f"PCF: {detail.pcf_distance:.0f}"
+            )
 
     def on_mouse_motion(self, x, y, dx, dy):
         if self.exclusive_mouse:
@@ -123,9 +161,9 @@ class World:
         self.astro = astronomy(utctime)
 
     def on_draw(self):
-        self.camera.compute_matrices()
+        self.virtual_rc.upload()
 
-        self.shadow_map.render(self.camera, self.astro.sun_altaz, self.virtual_rc.scenes())
+        self.shadow_map.render(self.camera, self.astro.sun_altaz, self.virtual_rc.scenes(), self.virtual_rc.detail)
 
         gl.glViewport(0, 0, self.window.width, self.window.height)
         self.window.clear()
@@ -146,7 +184,7 @@ class World:
             input_vector += Vector(1, 0, 0)
 
         self.camera.update(dt, input_vector)
-        self.avatar_update_queue.put({"type": "pos", "payload": self.avatar_position()})
+        self.avatar_channel.put({"type": "pos", "payload": self.avatar_position()})
 
     def avatar_position(self):
         return {
@@ -156,21 +194,12 @@ class World:
         }
 
 
-class DeduplicatingQueue(Queue):
-    def __init__(self):
-        super().__init__()
-        self.last_item = object()
-
-    def put(self, item, block=True, timeout=None):
-        if item != self.last_item:
-            self.last_item = item
-            super().put(item, block=block, timeout=timeout)
-
-
-async def avatar_updates(avatars_update_queue):
-    with ThreadPoolExecutor(max_workers=1) as executor:
-        loop = asyncio.get_event_loop()
-        while message := await loop.run_in_executor(executor, avatars_update_queue.get):
+async def avatar_updates(avatar_channel):
+    # Until the None put on closing.
+    async for batch in avatar_channel.batches():
+        for message in batch:
+            if message is None:
+                return
             yield message
 
 
@@ -193,44 +222,62 @@ async def rocket_control(session, bot, pos):
 
 
 
-async def space_avatar_worker(avatar_queue):
+async def space_avatar_worker(avatar_channel, publisher):
     rockets = []
     async with rctogether.RestApiSession() as session:
         bot_id = None
+        bot_ready = asyncio.Event()
         for bot in await rctogether.bots.get(session):
             if bot["emoji"] == "👾":
                 bot_id = bot["id"]
+                bot_ready.set()
             else:
                 await rctogether.bots.delete(session, bot["id"])
 
-        async for message in avatar_updates(avatar_queue):
-            try:
-                if message["type"] == "pos":
-                    pos = message["payload"]
-
-                    if bot_id:
-                        await rctogether.bots.update(session, bot_id, pos)
-                    else:
-                        bot = await rctogether.bots.create(
-                            session,
-                            name="Extra-dimensional Avatar",
-                            emoji="👾",
-                            x=pos["x"],
-                            y=pos["y"],
-                        )
-                        bot_id = bot["id"]
-                elif message["type"] == "wall":
-                    if message["payload"]["action"] == "create":
-                        await walls.create(session, bot_id=bot_id, color=message["payload"]["color"])
-                    elif message["payload"]["action"] == "upload":
-                        pass  # Not supported without getting the wall id.
-                        # await walls.update(session, bot_id=bot_id, color=message['payload']['color'])
-                elif message["type"] == "rocket":
-                    pos = message["payload"]
-                    bot = await rctogether.bots.create(session, name="Alien Rocket", emoji="🚀", **pos)
-                    rockets.append(asyncio.create_task(rocket_control(session, bot, pos)))
-            except rctogether.api.HttpError:
-                traceback.print_exc()
+        async def send_position(pos):
+            nonlocal bot_id
+            if bot_id:
+                await rctogether.bots.update(session, bot_id, pos)
+            else:
+                bot = await rctogether.bots.create(
+                    session,
+                    name="Extra-dimensional Avatar",
+                    emoji="👾",
+                    x=pos["x"],
+                    y=pos["y"],
+                )
+                bot_id = bot["id"]
+                bot_ready.set()
+
+        async def send_command(message):
+            if message["type"] == "wall":
+                if message["payload"]["action"] == "create":
+                    # Walls are built where the avatar's bot stands.
+                    await publisher.send_latest_position()
+                    try:
+                        await asyncio.wait_for(bot_ready.wait(), BOT_READY_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        print("Dropped a wall: the avatar's bot doesn't exist.")
+                        return
+                    await walls.create(session, bot_id=bot_id, color=message["payload"]["color"])
+                elif message["payload"]["action"] == "upload":
+                    pass  # Not supported without getting the wall id.
+                    # await walls.update(session, bot_id=bot_id, color=message['payload']['color'])
+            elif message["type"] == "rocket":
+                pos = message["payload"]
+                bot = await rctogether.bots.create(session, name="Alien Rocket", emoji="🚀", **pos)
+                rockets.append(asyncio.create_task(rocket_control(session, bot, pos)))
+
+        publishing = publisher.start(send_position, send_command)
+        async for message in avatar_updates(avatar_channel):
+            publisher.put(message)
+
+        await publisher.drain()
+        publishing.cancel()
+        try:
+            await publishing
+        except asyncio.exceptions.CancelledError:
+            pass
 
         if bot_id:
             await rctogether.bots.delete(session, bot_id)
@@ -242,18 +289,28 @@ async def space_avatar_worker(avatar_queue):
                 pass
 
 
-async def websocket_subscription(entity_queue):
-    async with aiohttp.ClientSession() as session:
-        async for entity in rctogether.WebsocketSubscription():
-            if entity["type"] == "Avatar" and entity["id"] not in PHOTOS:
-                image_data = await photos.get_photo(session, entity["id"], entity["image_path"])
-                PHOTOS[entity["id"]] = image_data
-            entity_queue.put(entity)
-
+async def websocket_subscription(entity_channel):
+    # Entities are passed on as they arrive. Avatar photos follow later, as
+    # Photo events.
+    def photo_ready(avatar_id, image_data):
+        entity_channel.put({"type": "Photo", "id": avatar_id, "image_data": image_data})
 
-async def async_thread_main(entity_queue, avatar_update_queue_future):
-    subscription = asyncio.create_task(websocket_subscription(entity_queue))
-    await space_avatar_worker(avatar_update_queue_future)
+    async with aiohttp.ClientSession() as session:
+        fetcher = photos.PhotoFetcher(
+            lambda avatar_id, image_path: photos.get_photo(session, avatar_id, image_path), photo_ready
+        )
+        try:
+            async for entity in rctogether.WebsocketSubscription():
+                if entity["type"] == "Avatar":
+                    fetcher.request(entity["id"], entity["image_path"])
+                entity_channel.put(entity)
+        finally:
+            await fetcher.close()
+
+
+async def async_thread_main(entity_channel, avatar_channel, publisher):
+    subscription = asyncio.create_task(websocket_subscription(entity_channel))
+    await space_avatar_worker(avatar_channel, publisher)
     subscription.cancel()
     try:
         await subscription
@@ -262,28 +319,34 @@ async def async_thread_main(entity_queue, avatar_update_queue_future):
 
 
 def main(args):
-    entity_queue = Queue()
-    avatar_update_queue = DeduplicatingQueue()
+    entity_channel = Channel()
+    avatar_channel = DeduplicatingChannel()
+    publisher = AvatarPublisher(args.position_rate)
+
+    if args.prewarm_glyphs:
+        prewarm_glyphs()
 
     if args.connect:
         async_thread = threading.Thread(
-            target=lambda: asyncio.run(async_thread_main(entity_queue, avatar_update_queue))
+            target=lambda: asyncio.run(async_thread_main(entity_channel, avatar_channel, publisher))
         )
         async_thread.start()
 
     try:
-        World(
-            entity_queue,
-            avatar_update_queue,
+        world = World(
+            entity_channel,
+            avatar_channel,
+            publisher,
             offset=args.offset,
             speed=args.speed,
             show_grid=args.grid,
             show_atmosphere=args.atmosphere,
         )
         pyglet.app.run()
+        world.virtual_rc.thumbnails.close()
     finally:
         if args.connect:
-            avatar_update_queue.put(None)
+            avatar_channel.put(None)
             async_thread.join()
 
 
@@ -294,5 +357,7 @@ if __name__ == "__main__":
     argument_parser.add_argument("--grid", action="store_true")
     argument_parser.add_argument("--speed", type=int)
     argument_parser.add_argument("--offset", type=int, default=0)
+    argument_parser.add_argument("--prewarm-glyphs", action="store_true")
+    argument_parser.add_argument("--position-rate", type=float, default=MAX_POSITION_RATE)
 
     main(argument_parser.parse_args())
@@ -0,0 +1,127 @@
+import numpy as np
+
+from mesh import DEFAULT_TEXTURE, INSTANCE_DTYPE, VERTEX_DTYPE, Mesh, color_to_rgb, concatenate, cube_vertices
+
+BLOCK_SIZE = 16
+
+# Faces in CUBE_CORNERS order, with the cell each side face looks into. The
+# bottom faces sit on the floor and are never seen, but they're kept because
+# the shadow pass draws back faces.
+BACK, FRONT, LEFT, RIGHT, BOTTOM, TOP = range(6)
+NEIGHBOURS = {BACK: (0, -1), FRONT: (0, 1), LEFT: (-1, 0), RIGHT: (1, 0)}
+
+
+def greedy_rectangles(cells):
+    # Cover {(x, z): key} with rectangles of cells sharing a key, as
+    # (x, z, width, depth). Cells whose key is None are never merged.
+    remaining = dict(cells)
+    for (x, z) in sorted(cells):
+        if (x, z) not in remaining:
+            continue
+        key = remaining.pop((x, z))
+
+        (width, depth) = (1, 1)
+        if key is not None:
+            while remaining.get((x, z + depth)) == key:
+                depth += 1
+            while all(remaining.get((x + width, z + i)) == key for i in range(depth)):
+                width += 1
+
+        for i in range(width):
+            for j in range(depth):
+                remaining.pop((x + i, z + j), None)
+        yield (x, z, width, depth)
+
+
+class WallMesher:
+    # Walls are unit cubes on the integer grid. Rather than a cube each, the
+    # grid is meshed in square blocks: faces against a neighbouring wall are
+    # dropped, and coplanar faces of the same colour without text are merged.
+    # Changing a wall only remeshes the blocks holding it and its neighbours.
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self.walls = {}
+        self.cells = {}
+        self.blocks = {}
+        self.dirty = set()
+
+    def block(self, cell):
+        return (cell[0] // self.block_size, cell[1] // self.block_size)
+
+    def add_wall(self, wall_id, x, z, color, texture=None):
+        # Returns the id of the wall this one replaced in its cell, or None.
+        self.delete_wall(wall_id)
+
+        cell = (x, z)
+        replaced = self.cells.get(cell)
+        if replaced is not None:
+            self.delete_wall(replaced)
+
+        self.walls[wall_id] = (cell, color_to_rgb(color), texture)
+        self.cells[cell] = wall_id
+        self.blocks.setdefault(self.block(cell), set()).add(cell)
+        self.touch(cell)
+        return replaced
+
+    def delete_wall(self, wall_id):
+        if wall_id not in self.walls:
+            return
+
+        (cell, _, _) = self.walls.pop(wall_id)
+        del self.cells[cell]
+        self.blocks[self.block(cell)].discard(cell)
+        self.touch(cell)
+
+    def touch(self, cell):
+        (x, z) = cell
+        self.dirty.add(self.block(cell))
+        for (dx, dz) in NEIGHBOURS.values():
+            self.dirty.add(self.block((x + dx, z + dz)))
+
+    def take_dirty(self):
+        # Returns {block: mesh} for every block changed since the last call,
+        # with None for blocks that are now empty.
+        dirty = self.dirty
+        self.dirty = set()
+        return {block: self.block_mesh(block) for block in dirty}
+
+    def block_mesh(self, block):
+        cells = self.blocks.get(block)
+        if not cells:
+            return None
+
+        parts = []
+        for face in (BACK, FRONT, LEFT, RIGHT, BOTTOM, TOP):
+            if face in NEIGHBOURS:
+                (dx, dz) = NEIGHBOURS[face]
+                exposed = [(x, z) for (x, z) in cells if (x + dx, z + dz) not in self.cells]
+            else:
+                exposed = cells
+
+            keys = {}
+            for cell in exposed:
+                (_, color, texture) = self.walls[self.cells[cell]]
+                keys[cell] = None if texture else color
+
+            if keys:
+                parts.append(self.face_vertices(face, greedy_rectangles(keys)))
+
+        return Mesh(concatenate(parts, VERTEX_DTYPE))
+
+    def face_vertices(self, face, rectangles):
+        # Each rectangle is the face of a box over its cells, taken from the
+        # vertices of that box as a cube instance.
+        rectangles = np.array(list(rectangles), dtype=np.float32).reshape(-1, 4)
+        walls = [self.walls[self.cells[(int(x), int(z))]] for (x, z, _, _) in rectangles]
+        textures = [texture or DEFAULT_TEXTURE for (_, _, texture) in walls]
+        (x, z, width, depth) = rectangles.T
+
+        instances = np.zeros(len(rectangles), INSTANCE_DTYPE)
+        instances["origin"] = np.stack([x - 0.5, np.zeros_like(x), z - 0.5], axis=1)
+        instances["size"] = np.stack([width, np.ones_like(x), depth], axis=1)
+        instances["tex_rect"] = [texture[:4] for texture in textures]
+        instances["color"] = [color for (_, color, _) in walls]
+        instances["layer"] = [texture.layer for texture in textures]
+
+        vertices = cube_vertices(instances).reshape(len(rectangles), -1)
+        return vertices[:, 4 * face : 4 * face + 4].reshape(-1)
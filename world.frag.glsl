@@ -13,6 +13,7 @@ in vec4 frag_pos_light_space;
 
 uniform vec3 camera;
 uniform vec3 sun_position;
+uniform float pcf_distance;
 // in float interpolated_shading_value;
 
 float compute_shadow(vec4 frag_pos_light_space, float bias) {
@@ -25,6 +26,11 @@ float compute_shadow(vec4 frag_pos_light_space, float bias) {
 
 	float currentDepth = projCoords.z;
 
+	// Far away a single sample is indistinguishable from filtering.
+	if (length(camera - interpolated_position) > pcf_distance) {
+		return currentDepth - bias > texture(shadow_map, projCoords.xy).r ? 1.0 : 0.0;
+	}
+
 	float shadow = 0.0;
 	vec2 texelSize = 1.0 / textureSize(shadow_map, 0);
 	for(int x = -1; x <= 1; ++x)
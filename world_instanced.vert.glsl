@@ -0,0 +1,36 @@
+#version 330
+
+layout(location = 0) in vec3 corner;
+layout(location = 1) in vec3 normal;
+layout(location = 2) in vec2 tex_corner;
+
+layout(location = 3) in vec3 origin;
+layout(location = 4) in vec3 size;
+layout(location = 5) in vec4 tex_rect; // x0, x1, y0, y1
+layout(location = 6) in vec3 color;
+layout(location = 7) in float layer;
+
+out vec3 local_color;
+out vec3 local_normal;
+out vec3 interpolated_tex_coords;
+out vec3 interpolated_position;
+
+out vec4 frag_pos_light_space;
+
+uniform mat4 matrix;
+uniform mat4 light_space_matrix;
+
+void main(void) {
+	vec3 vertex_position = origin + corner * size;
+
+	local_color = color;
+	local_normal = normal;
+
+	interpolated_tex_coords = vec3(mix(tex_rect.xz, tex_rect.yw, tex_corner), layer);
+
+	interpolated_position = vertex_position;
+
+	frag_pos_light_space = light_space_matrix * vec4(interpolated_position, 1.0);
+
+	gl_Position = matrix * vec4(vertex_position, 1.0);
+}